@@ -4,9 +4,17 @@ import sys
 
 READme = Path("README.md")
 LB = Path("leaderboard.md")
+BENCH = Path("bench.md")
 
 START = "<!-- LB-START -->"
 END = "<!-- LB-END -->"
+BENCH_START = "<!-- BENCH-START -->"
+BENCH_END = "<!-- BENCH-END -->"
+
+def replace_block(text: str, start: str, end: str, body: str) -> str:
+    before, rest = text.split(start, 1)
+    _, after = rest.split(end, 1)
+    return before + f"{start}\n\n{body}\n\n{end}" + after
 
 def main() -> None:
     if not LB.exists():
@@ -20,10 +28,10 @@ def main() -> None:
         print("Markers not found in README.md", file=sys.stderr)
         sys.exit(1)
 
-    before, rest = readme_text.split(START, 1)
-    _, after = rest.split(END, 1)
-    new_block = f"{START}\n\n{lb_text}\n\n{END}"
-    updated = before + new_block + after
+    updated = replace_block(readme_text, START, END, lb_text)
+    # benchmark table is optional: only refreshed when `cli bench` has written bench.md
+    if BENCH.exists() and BENCH_START in updated and BENCH_END in updated:
+        updated = replace_block(updated, BENCH_START, BENCH_END, BENCH.read_text(encoding="utf-8").strip())
 
     READme.write_text(updated, encoding="utf-8")
     print("README.md updated with leaderboard.")
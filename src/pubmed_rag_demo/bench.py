@@ -0,0 +1,229 @@
+"""
+Reproducible retrieval benchmark on synthetic PubMed-like corpora.
+
+Corpora are generated deterministically from a seed: a Zipfian vocabulary
+whose head is common abstract words ("patients", "study", ...), abstract
+lengths drawn log-normally around ~220 tokens, and sentences of 12-30 words.
+Documents come in fixed chunks seeded by (seed, chunk), so a smaller corpus
+is a prefix of a larger one. Each QA pair targets one document: the question
+mixes two of its rarer terms with common words, the answer is its rarest term.
+
+For every (size, retriever) the benchmark records build time, peak RSS
+(measured in a fresh process), in-memory index size, single-query QPS and
+p50/p99 latency, batched QPS and hit_rate@k.
+"""
+from __future__ import annotations
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from .compact import CompactBM25Retriever, retriever_nbytes
+from .dense import DenseRetriever
+from .eval import context_hit_rate, retrieve_all
+from .impact import PrunedRetriever
+from .retriever import BM25Retriever
+
+try:  # peak RSS; unavailable on Windows
+    import resource
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None  # type: ignore[assignment]
+
+RETRIEVERS = ("bm25", "pruned", "compact", "dense")
+
+_COMMON = (
+    "the of and in to a with for was were patients study results is by on that as "
+    "at from or be are this these we clinical treatment group associated disease "
+    "analysis effect increased cells significantly data using risk compared cancer "
+    "expression after high levels between two than showed methods patient age"
+).split()
+_ONSETS = ("b c d f g h k l m n p r s t v z br cr dr gl pl pr st tr ch th").split()
+_VOWELS = ("a e i o u ae io ia ou y").split()
+_CODAS = ("", "", "", "n", "s", "l", "r", "x", "m", "t")
+_CHUNK = 10_000
+
+def synthetic_vocabulary(size: int, seed: int = 0) -> np.ndarray:
+    """Common words first, then distinct pseudo-biomedical words (2-4 syllables) in rank order."""
+    rng = np.random.default_rng([seed, 0x70CAB])
+    words = list(dict.fromkeys(_COMMON))[:size]
+    seen = set(words)
+    while len(words) < size:
+        n_syl = int(rng.integers(2, 5))
+        w = "".join(
+            _ONSETS[rng.integers(len(_ONSETS))] + _VOWELS[rng.integers(len(_VOWELS))] for _ in range(n_syl)
+        ) + _CODAS[rng.integers(len(_CODAS))]
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    return np.asarray(words, dtype=object)
+
+def _zipf_cdf(size: int, a: float) -> np.ndarray:
+    p = 1.0 / np.arange(1, size + 1) ** a
+    return np.cumsum(p / p.sum())
+
+def synthetic_corpus(
+    n_docs: int, seed: int = 0, vocab_size: int = 50_000, zipf_a: float = 1.07
+) -> Tuple[List[str], List[str]]:
+    """(docs, ids) of n_docs synthetic abstracts; deterministic for (seed, vocab_size, zipf_a)."""
+    vocab = synthetic_vocabulary(vocab_size, seed)
+    cdf = _zipf_cdf(vocab_size, zipf_a)
+    docs: List[str] = []
+    for chunk in range((n_docs + _CHUNK - 1) // _CHUNK):
+        # independent streams per chunk, so a partial chunk is a prefix of the full one
+        len_rng, tok_rng, sent_rng = (np.random.default_rng([seed, chunk, s]) for s in range(3))
+        n = min(_CHUNK, n_docs - chunk * _CHUNK)
+        lens = np.clip(len_rng.lognormal(np.log(220), 0.35, _CHUNK)[:n], 40, 600).astype(np.int64)
+        ranks = np.minimum(np.searchsorted(cdf, tok_rng.random(int(lens.sum()))), vocab_size - 1)
+        tokens = vocab[ranks]
+        breaks = sent_rng.integers(12, 31, int(lens.sum()))  # sentence lengths
+        pos = 0
+        for length in lens.tolist():
+            words = tokens[pos : pos + length]
+            sents, i = [], 0
+            while i < length:
+                step = int(breaks[pos + i])
+                sents.append(" ".join(words[i : i + step]).capitalize() + ".")
+                i += step
+            docs.append(" ".join(sents))
+            pos += length
+    return docs, [f"SYN{i:07d}" for i in range(n_docs)]
+
+def synthetic_qa(docs: Sequence[str], n: int, seed: int = 0, vocab_size: int = 50_000) -> List[Tuple[str, str]]:
+    """n (question, answer) pairs, each built from one randomly chosen document."""
+    rank = {w: i for i, w in enumerate(synthetic_vocabulary(vocab_size, seed).tolist())}
+    rng = np.random.default_rng([seed, 0xA5])
+    pairs = []
+    for d in rng.choice(len(docs), size=min(n, len(docs)), replace=False).tolist():
+        terms = sorted(set(docs[d].lower().replace(".", "").split()), key=lambda w: -rank[w])
+        rare = terms[:2]
+        common = [_COMMON[int(i)] for i in rng.integers(10, 25, 2)]
+        pairs.append((" ".join(rare[1:] + common[:1] + rare[:1] + common[1:]), rare[0]))
+    return pairs
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+def _build(name: str, docs: List[str], ids: List[str], prune_budget: float) -> Tuple[Any, float]:
+    if name == "dense":
+        dense = DenseRetriever()
+        dense.add(docs, ids=ids)
+        return dense, dense.vectors.nbytes
+    r = BM25Retriever()
+    r.add(docs, ids=ids)
+    if name == "bm25":
+        return r, retriever_nbytes(r)["total"]
+    if name == "pruned":
+        pruned = PrunedRetriever(r, budget=prune_budget)
+        impact = pruned.impact_index()
+        extra = impact.indptr.nbytes + impact.rows.nbytes + impact.impacts.nbytes
+        return pruned, retriever_nbytes(r)["total"] + extra
+    if name == "compact":
+        c = CompactBM25Retriever(r)
+        return c, c.memory_report()["total"]
+    raise ValueError(f"unknown retriever: {name!r} (use one of {', '.join(RETRIEVERS)})")
+
+def measure(
+    name: str,
+    n_docs: int,
+    n_queries: int = 200,
+    k: int = 10,
+    seed: int = 0,
+    vocab_size: int = 50_000,
+    batch_size: int = 64,
+    prune_budget: float = 0.3,
+) -> Dict[str, Any]:
+    """Build one retriever over the n_docs corpus and time its queries."""
+    docs, ids = synthetic_corpus(n_docs, seed, vocab_size)
+    qa = synthetic_qa(docs, n_queries, seed, vocab_size)
+    questions = [q for q, _ in qa]
+    rss_before = _peak_rss_mb()
+    t0 = time.perf_counter()
+    r, index_bytes = _build(name, docs, ids, prune_budget)
+    build_s = time.perf_counter() - t0
+    rss_after = _peak_rss_mb()
+    build_rss = rss_after - rss_before if rss_after is not None and rss_before is not None else None
+    del docs
+
+    r.query(questions[0], k=k)  # warm lazily computed state
+    lat = np.zeros(len(questions))
+    for i, q in enumerate(questions):
+        t0 = time.perf_counter()
+        r.query(q, k=k)
+        lat[i] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for lo in range(0, len(questions), batch_size):
+        r.query_batch(questions[lo : lo + batch_size], k=k)
+    batch_s = time.perf_counter() - t0
+    results = retrieve_all(questions, r, k=k)
+    return {
+        "retriever": name,
+        "n_docs": n_docs,
+        "n_queries": len(questions),
+        "k": k,
+        "build_s": build_s,
+        "peak_rss_mb": rss_after,
+        "build_rss_mb": build_rss,
+        "index_mb": index_bytes / (1 << 20),
+        "qps": len(questions) / lat.sum() if lat.sum() > 0 else float("inf"),
+        "p50_ms": float(np.percentile(lat, 50) * 1000),
+        "p99_ms": float(np.percentile(lat, 99) * 1000),
+        "batch_qps": len(questions) / batch_s if batch_s > 0 else float("inf"),
+        "hit_rate": context_hit_rate(qa, r, k=k, results=results)["hit_rate"],
+    }
+
+def run_bench(
+    sizes: Sequence[int],
+    retrievers: Sequence[str] = ("bm25", "pruned", "compact"),
+    isolate: bool = True,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    measure() every (size, retriever). With isolate=True each runs in a fresh
+    spawned process, so peak RSS belongs to that configuration alone.
+    """
+    rows = []
+    for n_docs in sizes:
+        for name in retrievers:
+            if name not in RETRIEVERS:
+                raise ValueError(f"unknown retriever: {name!r} (use one of {', '.join(RETRIEVERS)})")
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    rows.append(pool.submit(measure, name, n_docs, **kwargs).result())
+            else:
+                rows.append(measure(name, n_docs, **kwargs))
+    return rows
+
+def to_markdown(rows: Sequence[Dict[str, Any]]) -> str:
+    lines = [
+        "| docs | retriever | build s | peak RSS MB (build) | index MB | QPS | p50 ms | p99 ms | batch QPS | hit_rate |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for r in rows:
+        rss = "n/a" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f} (+{r['build_rss_mb']:.0f})"
+        lines.append(
+            f"| {r['n_docs']:,} | {r['retriever']} | {r['build_s']:.2f} | {rss} | {r['index_mb']:.1f} "
+            f"| {r['qps']:.0f} | {r['p50_ms']:.2f} | {r['p99_ms']:.2f} | {r['batch_qps']:.0f} "
+            f"| {r['hit_rate']:.3f} |"
+        )
+    return "\n".join(lines)
+
+def parse_sizes(text: str) -> List[int]:
+    """'10k,100k,1m' -> [10000, 100000, 1000000]."""
+    scale = {"k": 1_000, "m": 1_000_000}
+    out = []
+    for part in text.lower().split(","):
+        part = part.strip()
+        if part:
+            out.append(int(float(part[:-1]) * scale[part[-1]]) if part[-1] in scale else int(part))
+    return out
+
+def write_results(rows: Sequence[Dict[str, Any]], out_json: str | Path, out_md: str | Path) -> None:
+    meta = {"generated": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": list(rows)}
+    Path(out_json).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    Path(out_md).write_text(to_markdown(rows), encoding="utf-8")
@@ -1,21 +1,134 @@
 from __future__ import annotations
 import json
 from pathlib import Path
+from typing import Optional
 import typer
-from .index import build_bm25_from_dir, topk_ids_scores
+from .index import (
+    build_bm25,
+    build_index_external,
+    default_index_dir,
+    iter_source_chunks,
+    open_index,
+    save_index,
+    source_fingerprint,
+    topk_ids_scores,
+)
 
 app = typer.Typer(add_completion=False)
+index_app = typer.Typer(add_completion=False, help="Manage persisted BM25 indexes")
+app.add_typer(index_app, name="index")
 
 @app.command()
 def query(
-    data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts"),
+    data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts, or a PubMed XML / JSONL / CSV file"),
     q: str = typer.Option(..., "--q", "-q", help="Query text"),
     k: int = typer.Option(3, "--k", "-k", help="Top-k results"),
+    index_dir: Optional[str] = typer.Option(
+        None, "--index-dir", help="Persisted index (default: DATA_DIR/.bm25_index); rebuilt if stale"
+    ),
+    workers: int = typer.Option(1, "--workers", "-w", help="Processes for (re)building the index"),
 ):
-    r = build_bm25_from_dir(Path(data_dir))
+    r = open_index(Path(data_dir), index_dir, workers=workers)
     results = topk_ids_scores(r, q, k=k)
     typer.echo(json.dumps({"query": q, "results": results}, ensure_ascii=False, indent=2))
 
+@app.command()
+def serve(
+    data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts, or a PubMed XML / JSONL / CSV file"),
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface to bind"),
+    port: int = typer.Option(8000, "--port", "-p", help="Port to listen on"),
+    index_dir: Optional[str] = typer.Option(
+        None, "--index-dir", help="Persisted index (default: DATA_DIR/.bm25_index); rebuilt if stale"
+    ),
+    workers: int = typer.Option(1, "--workers", "-w", help="Processes for (re)building the index"),
+    batch_window_ms: float = typer.Option(2.0, "--batch-window-ms", help="Group /query requests arriving within this window"),
+    max_batch: int = typer.Option(64, "--max-batch", help="Most queries scored in one batch"),
+    timeout_s: float = typer.Option(5.0, "--timeout", help="Per-request timeout in seconds"),
+    max_body_kb: int = typer.Option(1024, "--max-body-kb", help="Largest accepted request body"),
+    cache_size: int = typer.Option(0, "--cache-size", help="LRU result cache entries (0 = off)"),
+    cache_ttl: Optional[float] = typer.Option(None, "--cache-ttl", help="Seconds before a cached result expires"),
+):
+    from .server import QueryServer, run_server
+
+    r = open_index(Path(data_dir), index_dir, workers=workers)
+    r.enable_cache(cache_size, ttl=cache_ttl)
+    server = QueryServer(
+        r,
+        batch_window_ms=batch_window_ms,
+        max_batch=max_batch,
+        timeout_s=timeout_s,
+        max_body_bytes=max_body_kb * 1024,
+    )
+    typer.echo(f"Serving {len(r)} docs on http://{host}:{port}")
+    run_server(server, host, port)
+
+@app.command()
+def bench(
+    sizes: str = typer.Option("10k,100k", "--sizes", help="Corpus sizes to generate, e.g. 10k,100k,1m"),
+    retrievers: str = typer.Option("bm25,pruned,compact", "--retrievers", help="Any of bm25, pruned, compact, dense"),
+    queries: int = typer.Option(200, "--queries", help="QA pairs per corpus"),
+    k: int = typer.Option(10, "--k", "-k", help="Top-k per query"),
+    seed: int = typer.Option(0, "--seed", help="Corpus and QA seed"),
+    out: str = typer.Option("bench.json", "--out", help="Machine-readable results"),
+    markdown: str = typer.Option("bench.md", "--markdown", help="Markdown table for scripts/update_readme.py"),
+    isolate: bool = typer.Option(True, "--isolate/--no-isolate", help="Run each configuration in a fresh process"),
+):
+    """Benchmark retrievers on deterministic synthetic PubMed-like corpora."""
+    from .bench import parse_sizes, run_bench, to_markdown, write_results
+
+    rows = run_bench(
+        parse_sizes(sizes),
+        [r.strip() for r in retrievers.split(",") if r.strip()],
+        isolate=isolate, n_queries=queries, k=k, seed=seed,
+    )
+    write_results(rows, out, markdown)
+    typer.echo(to_markdown(rows))
+    typer.echo(f"Saved {out} and {markdown}")
+
+@index_app.command("build")
+def index_build(
+    data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts, or a PubMed XML / JSONL / CSV file"),
+    out: Optional[str] = typer.Option(
+        None, "--out", "-o", help="Index directory (default: DATA_DIR/.bm25_index)"
+    ),
+    workers: int = typer.Option(1, "--workers", "-w", help="Processes for reading/tokenizing"),
+    memory_mb: Optional[float] = typer.Option(
+        None, "--memory-mb", help="Stream the corpus and build with external sorted runs in this budget"
+    ),
+    schema: Optional[str] = typer.Option(
+        None, "--schema", help="JSON schema that JSONL/CSV records must satisfy"
+    ),
+):
+    out_p = Path(out) if out else default_index_dir(data_dir)
+    fingerprint = source_fingerprint(data_dir)
+    if memory_mb is not None:
+        chunks = iter_source_chunks(Path(data_dir), workers=workers, schema=schema)
+        build_index_external(chunks, out_p, memory_mb=memory_mb, fingerprint=fingerprint)
+        typer.echo(f"Saved index to {out_p}")
+        return
+    r = build_bm25(Path(data_dir), workers=workers, schema=schema)
+    save_index(r, out_p, fingerprint=fingerprint)
+    typer.echo(f"Saved index ({len(r)} docs) to {out_p}")
+
+@index_app.command("stats")
+def index_stats(
+    data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts, or a PubMed XML / JSONL / CSV file"),
+    workers: int = typer.Option(1, "--workers", "-w", help="Processes for reading/tokenizing"),
+):
+    """Memory per document of the in-memory vs compact index, and postings decode throughput."""
+    from .compact import CompactBM25Retriever, decode_throughput, retriever_nbytes
+
+    r = build_bm25(Path(data_dir), workers=workers)
+    plain = retriever_nbytes(r)
+    compact = CompactBM25Retriever(r)
+    report = {
+        "n_docs": len(compact),
+        "in_memory": plain,
+        "compact": compact.memory_report(),
+        "decode_postings_per_s": decode_throughput(compact),
+    }
+    typer.echo(json.dumps(report, indent=2))
+
 def main():
     app()
 
@@ -0,0 +1,311 @@
+"""
+Read-only BM25 index packed for memory-bound deployments.
+
+Postings are row gaps in variable-byte code, term frequencies are quantized to
+uint8/uint16, the vocabulary and document ids are front-coded sorted strings,
+and texts live in one UTF-8 blob. Nothing is kept per document as a Python
+object, and scores equal the BM25Retriever the index was built from.
+"""
+from __future__ import annotations
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from .index import PackedTexts
+from .retriever import BM25Retriever, _merge_segments, _tokenize, _topk
+
+def varbyte_encode(values: np.ndarray) -> np.ndarray:
+    """Non-negative integers as little-endian 7-bit groups; the high bit marks "more bytes follow"."""
+    values = np.asarray(values, dtype=np.int64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> 7
+    while rest.any():
+        n_bytes += rest > 0
+        rest >>= 7
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.zeros(int(n_bytes.sum()), dtype=np.uint8)
+    for i in range(int(n_bytes.max(initial=0))):
+        has = n_bytes > i
+        byte = (values[has] >> (7 * i)) & 0x7F
+        more = n_bytes[has] > i + 1
+        out[starts[has] + i] = byte | (more.astype(np.int64) << 7)
+    return out
+
+def varbyte_decode(data: np.ndarray) -> np.ndarray:
+    """Inverse of varbyte_encode for a whole buffer."""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    last = data < 0x80
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    shift = 7 * (np.arange(len(data)) - np.repeat(starts, np.diff(np.append(starts, len(data)))))
+    return np.add.reduceat((data & 0x7F).astype(np.int64) << shift, starts)
+
+def quantize_tfs(tfs: np.ndarray) -> np.ndarray:
+    """Term frequencies in the narrowest of uint8/uint16; ValueError past 65535, as scores would change."""
+    tfs = np.asarray(tfs)
+    top = int(tfs.max(initial=0))
+    if top > 0xFFFF:
+        raise ValueError(f"term frequency {top} does not fit in uint16")
+    return tfs.astype(np.uint8 if top <= 0xFF else np.uint16)
+
+def _narrow(offsets: np.ndarray) -> np.ndarray:
+    return offsets.astype(np.uint32) if offsets.max(initial=0) <= 0xFFFFFFFF else offsets
+
+def _put_varint(out: bytearray, v: int) -> None:
+    while v >= 0x80:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+
+def _get_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    v = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        v |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return v, pos
+        shift += 7
+
+class FrontCodedVocab:
+    """
+    Sorted string -> int map stored as front-coded blocks: each block of
+    `block` keys holds its first key in full and the rest as (shared prefix
+    length, suffix). Lookup binary-searches block heads, then scans one block.
+    """
+    __slots__ = ("_blob", "_ptr", "_values", "_block", "_n")
+
+    def __init__(self, mapping: Dict[str, int], block: int = 16) -> None:
+        keys = sorted((k.encode("utf-8"), v) for k, v in mapping.items())
+        blob = bytearray()
+        ptr: List[int] = []
+        prev = b""
+        for i, (key, _) in enumerate(keys):
+            if i % block == 0:
+                ptr.append(len(blob))
+                _put_varint(blob, len(key))
+                blob += key
+            else:
+                shared = 0
+                for a, b in zip(prev, key):
+                    if a != b:
+                        break
+                    shared += 1
+                _put_varint(blob, shared)
+                _put_varint(blob, len(key) - shared)
+                blob += key[shared:]
+            prev = key
+        self._blob = bytes(blob)
+        self._ptr = np.asarray(ptr, dtype=np.int64)
+        values = np.asarray([v for _, v in keys], dtype=np.int64)
+        self._values = values.astype(np.int32) if values.max(initial=0) <= 0x7FFFFFFF else values
+        self._block = block
+        self._n = len(keys)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.get(key) is not None
+
+    def _head(self, b: int) -> bytes:
+        n, pos = _get_varint(self._blob, int(self._ptr[b]))
+        return self._blob[pos : pos + n]
+
+    def _scan(self, b: int) -> Iterable[Tuple[int, bytes]]:
+        """(position, key) for every key of block b, in order."""
+        blob = self._blob
+        n, pos = _get_varint(blob, int(self._ptr[b]))
+        key = blob[pos : pos + n]
+        pos += n
+        first = b * self._block
+        yield first, key
+        for i in range(first + 1, min(first + self._block, self._n)):
+            shared, pos = _get_varint(blob, pos)
+            n, pos = _get_varint(blob, pos)
+            key = key[:shared] + blob[pos : pos + n]
+            pos += n
+            yield i, key
+
+    def position(self, key: str) -> int | None:
+        """Rank of key in sorted order, or None if absent."""
+        target = key.encode("utf-8")
+        lo, hi = 0, len(self._ptr)
+        while lo < hi:  # last block whose head <= target
+            mid = (lo + hi) // 2
+            if self._head(mid) <= target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        for i, k in self._scan(lo - 1):
+            if k == target:
+                return i
+            if k > target:
+                break
+        return None
+
+    def get(self, key: str, default: int | None = None) -> int | None:
+        pos = self.position(key)
+        return default if pos is None else int(self._values[pos])
+
+    def key_at(self, position: int) -> str:
+        for i, k in self._scan(position // self._block):
+            if i == position:
+                return k.decode("utf-8")
+        raise IndexError(position)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._blob) + self._ptr.nbytes + self._values.nbytes
+
+class CompactBM25Retriever:
+    """
+    Read-only BM25 over varbyte postings (see module docstring). Answers
+    query/query_rows/query_batch and the document accessors eval uses, with
+    scores equal to the BM25Retriever it was built from.
+    """
+    __slots__ = (
+        "k1", "b", "epsilon", "avgdl", "vocab", "idf", "byte_ptr", "post_bytes", "indptr", "tfs",
+        "doc_len", "ids", "_id_pos", "texts",
+    )
+
+    def __init__(self, r: BM25Retriever) -> None:
+        """Pack a snapshot of r's live documents (r itself is not modified)."""
+        r = r.snapshot()
+        idx = r.index
+        idx._refresh()
+        self.k1, self.b, self.epsilon = idx.k1, idx.b, idx.epsilon
+        self.avgdl = idx.avgdl
+        n_terms = len(idx.vocab)
+        if idx.segments:
+            seg = _merge_segments(idx.segments, n_terms, idx.live)
+            indptr, rows, tfs = seg.indptr, seg.post_rows.astype(np.int64), seg.tfs
+        else:
+            indptr = np.zeros(n_terms + 1, dtype=np.int64)
+            rows, tfs = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        # gaps between consecutive rows of a term; a term's first posting keeps its row
+        gaps = np.diff(rows, prepend=0)
+        firsts = indptr[:-1][np.diff(indptr) > 0]
+        gaps[firsts] = rows[firsts]
+        self.post_bytes = varbyte_encode(gaps)
+        # byte offset where each posting starts (plus the end), taken at term boundaries
+        starts = np.concatenate([[0], np.flatnonzero(self.post_bytes < 0x80) + 1])
+        self.byte_ptr = _narrow(starts[indptr])
+        self.indptr = _narrow(indptr)
+        self.tfs = quantize_tfs(tfs)
+        self.idf = idx.idf.copy() if idx.n_live else np.zeros(n_terms)
+        self.vocab = FrontCodedVocab(idx.vocab)
+        max_len = int(idx.doc_len.max(initial=0))
+        self.doc_len = idx.doc_len.astype(np.uint16 if max_len <= 0xFFFF else np.uint32)
+        self.ids = FrontCodedVocab({r.id_at(row): row for row in range(len(r))})
+        self._id_pos = np.empty(len(self.ids), dtype=np.int32)
+        self._id_pos[self.ids._values] = np.arange(len(self.ids), dtype=np.int32)
+        encoded = [d.encode("utf-8") for d in r._docs]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        self.texts = PackedTexts(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.ids
+
+    def postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Decoded (rows, tfs) of one term."""
+        gaps = varbyte_decode(self.post_bytes[self.byte_ptr[tid] : self.byte_ptr[tid + 1]])
+        return np.cumsum(gaps), self.tfs[self.indptr[tid] : self.indptr[tid + 1]]
+
+    def score(self, tokens: List[str]) -> np.ndarray:
+        """BM25 score of every row, accumulated as InvertedIndex.score does."""
+        scores = np.zeros(len(self))
+        avgdl = self.avgdl if self.avgdl > 0 else 1.0
+        for t in tokens:
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            rows, tf = self.postings(tid)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows].astype(np.float64) / avgdl)
+            scores[rows] += self.idf[tid] * (tf * (self.k1 + 1) / (tf + norm))
+        return scores
+
+    def query_rows(self, text: str, k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.score(_tokenize(text))
+        rows = _topk(scores, k)
+        return rows, scores[rows]
+
+    def query_batch(self, queries: List[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        width = max(0, min(k, len(self)))
+        rows = np.zeros((len(queries), width), dtype=np.int64)
+        scores = np.zeros((len(queries), width))
+        for i, q in enumerate(queries):
+            rows[i], scores[i] = self.query_rows(q, k)
+        return rows, scores
+
+    def query(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
+        rows, scores = self.query_rows(text, k=k)
+        return [(self.id_at(i), s) for i, s in zip(rows.tolist(), scores.tolist())]
+
+    def id_at(self, row: int) -> str:
+        return self.ids.key_at(int(self._id_pos[row]))
+
+    def row_of(self, doc_id: str) -> int:
+        row = self.ids.get(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        return row
+
+    def doc_at(self, row: int) -> str:
+        return self.texts[row]
+
+    def get_doc(self, doc_id: str) -> str:
+        return self.texts[self.row_of(doc_id)]
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        return [self.get_doc(i) for i in ids]
+
+    def iter_docs(self) -> Iterable[Tuple[str, str]]:
+        for row in range(len(self)):
+            yield self.id_at(row), self.texts[row]
+
+    def memory_report(self) -> Dict[str, float]:
+        """Resident bytes per component (texts included) and per document."""
+        report = {
+            "postings": self.post_bytes.nbytes + self.byte_ptr.nbytes + self.indptr.nbytes,
+            "tfs": self.tfs.nbytes,
+            "vocab": self.vocab.nbytes + self.idf.nbytes,
+            "doc_meta": self.doc_len.nbytes + self.ids.nbytes + self._id_pos.nbytes,
+            "texts": self.texts._blob.nbytes + self.texts._offsets.nbytes,
+        }
+        total = sum(report.values())
+        return {**report, "total": total, "bytes_per_doc": total / max(1, len(self))}
+
+def retriever_nbytes(r: BM25Retriever) -> Dict[str, float]:
+    """The same breakdown as memory_report() for a plain BM25Retriever (Python objects included)."""
+    idx = r.index
+    report = {
+        "postings": sum(s.indptr.nbytes + s.post_rows.nbytes for s in idx.segments),
+        "tfs": sum(s.tfs.nbytes for s in idx.segments),
+        "vocab": sys.getsizeof(idx.vocab) + sum(sys.getsizeof(t) + sys.getsizeof(i) for t, i in idx.vocab.items())
+        + idx.df.nbytes + idx.idf.nbytes,
+        "doc_meta": idx.doc_len.nbytes + idx.live.nbytes + idx.norm.nbytes
+        + sys.getsizeof(r._doc_ids) + sys.getsizeof(r._row_of)
+        + sum(sys.getsizeof(i) for i in r._doc_ids if i is not None),
+        "texts": sys.getsizeof(r._docs) + sum(sys.getsizeof(d) for d in r._docs),
+    }
+    total = sum(report.values())
+    return {**report, "total": total, "bytes_per_doc": total / max(1, len(r))}
+
+def decode_throughput(cr: CompactBM25Retriever, repeats: int = 3) -> float:
+    """Postings decoded per second over every posting list (best of `repeats`)."""
+    n_terms = len(cr.indptr) - 1
+    best = float("inf")
+    for _ in range(max(1, repeats)):
+        t0 = time.perf_counter()
+        for tid in range(n_terms):
+            cr.postings(tid)
+        best = min(best, time.perf_counter() - t0)
+    return int(cr.indptr[-1]) / best if best > 0 else float("inf")
@@ -0,0 +1,122 @@
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+try:  # optional C implementation (pip install .[fast])
+    import ahocorasick as _ahocorasick  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    _ahocorasick = None
+
+Results = List[List[Tuple[str, float]]]
+
+class AnswerMatcher:
+    """
+    Aho-Corasick automaton over lowercased answers: scan(text) returns the index
+    of every answer occurring in `text` (already lowercased) in a single pass.
+    Uses pyahocorasick when installed, otherwise a pure-Python automaton.
+    """
+    def __init__(self, answers: Iterable[str], native: Optional[bool] = None) -> None:
+        self.answers = list(dict.fromkeys(a.lower() for a in answers))
+        self.index = {a: i for i, a in enumerate(self.answers)}
+        self.empty = self.index.get("")  # "" occurs in every text
+        if native is None:
+            native = _ahocorasick is not None
+        self._native = None
+        if native:
+            if _ahocorasick is None:
+                raise ImportError("pyahocorasick is not installed")
+            self._native = _ahocorasick.Automaton()
+            for a, i in self.index.items():
+                if a:
+                    self._native.add_word(a, i)
+            self._native.make_automaton()
+        else:
+            self._build()
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for a, i in self.index.items():
+            if not a:
+                continue
+            node = 0
+            for ch in a:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append(i)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def scan(self, text: str) -> Set[int]:
+        found: Set[int] = set() if self.empty is None else {self.empty}
+        if self._native is not None:
+            if len(self._native):
+                found.update(i for _, i in self._native.iter(text))
+            return found
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+def containment_matrix(
+    answers: List[str],
+    per_q: Results,
+    retriever,
+    width: int,
+    use_automaton: Optional[bool] = None,
+    automaton_min: int = 256,
+) -> np.ndarray:
+    """
+    (len(answers), width) flags: answer i occurs (case-insensitively) in the j-th
+    document retrieved for question i. Each distinct document is lowercased once
+    (or read from the retriever's lowercased store, get_docs_lower). With many
+    distinct answers (>= automaton_min, and pyahocorasick installed) every
+    document is scanned once for all answers instead of once per question.
+    """
+    n = len(answers)
+    contains = np.zeros((n, width), dtype=np.bool_)
+    doc_ids = list(dict.fromkeys(doc_id for ranked in per_q for doc_id, _ in ranked[:width]))
+    if not doc_ids:
+        return contains
+    get_lower = getattr(retriever, "get_docs_lower", None)
+    if get_lower is not None:
+        lowered = dict(zip(doc_ids, get_lower(doc_ids)))
+    else:
+        lowered = {d: t.lower() for d, t in zip(doc_ids, retriever.get_docs(doc_ids))}
+    answers_l = [a.lower() for a in answers]
+    if use_automaton is None:
+        use_automaton = _ahocorasick is not None and len(set(answers_l)) >= automaton_min
+    if use_automaton:
+        matcher = AnswerMatcher(answers_l)
+        found = {d: matcher.scan(t) for d, t in lowered.items()}
+        for i, ranked in enumerate(per_q):
+            aid = matcher.index[answers_l[i]]
+            for j, (doc_id, _) in enumerate(ranked[:width]):
+                contains[i, j] = aid in found[doc_id]
+        return contains
+    for i, ranked in enumerate(per_q):
+        a = answers_l[i]
+        for j, (doc_id, _) in enumerate(ranked[:width]):
+            contains[i, j] = a in lowered[doc_id]
+    return contains
@@ -0,0 +1,136 @@
+"""
+Token-budgeted context assembly between retrieval and LLM.answer.
+
+Instead of sending the whole top-1 abstract, the sentences of the top-k
+documents are ranked by how many distinct query tokens they share (ties to
+the better-ranked document, then the earlier sentence) and packed greedily
+under a token budget. Sentences that are near-duplicates of one already
+taken (MinHash estimate of shingle Jaccard similarity) are skipped, so
+repeated boilerplate across abstracts is only paid for once. Assembled
+contexts are cached per (query, retrieved ids, index version).
+"""
+from __future__ import annotations
+import zlib
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from .cache import LRUCache
+from .monitor import MONITOR
+from .passages import SentenceIndex
+from .retriever import _tokenize
+
+_PRIME = (1 << 31) - 1
+
+def approx_tokens(text: str) -> int:
+    """Cheap LLM token estimate: about 4 characters per token, at least one per word."""
+    return max(len(_tokenize(text)), (len(text) + 3) // 4)
+
+class MinHasher:
+    """MinHash signatures of word n-gram shingles, via num_perm universal hashes mod 2^31-1."""
+    def __init__(self, num_perm: int = 64, shingle: int = 3, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        self.shingle = shingle
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)[:, None]
+
+    def shingles(self, text: str) -> np.ndarray:
+        toks = _tokenize(text)
+        n = self.shingle
+        grams = [" ".join(toks[i : i + n]) for i in range(len(toks) - n + 1)] if len(toks) >= n else toks
+        return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+    def signature(self, text: str) -> np.ndarray:
+        x = self.shingles(text) % np.uint64(_PRIME)
+        if len(x) == 0:
+            return np.full(len(self.a), _PRIME, dtype=np.uint64)
+        return ((self.a * x[None, :] + self.b) % np.uint64(_PRIME)).min(axis=1)
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+class ContextAssembler:
+    """
+    Builds LLM contexts of at most max_tokens (approx_tokens) from ranked
+    retrieval results. Sentences estimated at least dedup_threshold similar
+    to a selected one are dropped. Caching needs a retriever with `version`
+    (BM25Retriever); cache_size=0 turns it off.
+    """
+    def __init__(
+        self,
+        retriever,
+        max_tokens: int = 512,
+        dedup_threshold: float = 0.8,
+        num_perm: int = 64,
+        cache_size: int = 1024,
+        separator: str = "\n",
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.retriever = retriever
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.separator = separator
+        self._sep_tokens = approx_tokens(separator)
+        self.hasher = MinHasher(num_perm)
+        self.cache = LRUCache(cache_size) if cache_size > 0 else None
+        self.duplicates_skipped = 0
+
+    def assemble(self, query: str, ranked: Sequence[Tuple[str, float]]) -> str:
+        return self.assemble_many([query], [ranked])[0]
+
+    @MONITOR.timed("llm.context")
+    def assemble_many(self, queries: Sequence[str], results: Sequence[Sequence[Tuple[str, float]]]) -> List[str]:
+        """One context per (query, ranked results); one SentenceIndex covers all uncached queries."""
+        version = getattr(self.retriever, "version", None)
+        cache = self.cache if version is not None else None
+        out: List[Optional[str]] = [None] * len(queries)
+        keys = []
+        for i, (q, ranked) in enumerate(zip(queries, results)):
+            keys.append((q, tuple(doc_id for doc_id, _ in ranked), version))
+            if cache is not None:
+                out[i] = cache.get(keys[i])
+                if out[i] is not None:
+                    MONITOR.incr("llm.context_cache_hits")
+        todo = [i for i, ctx in enumerate(out) if ctx is None]
+        if todo:
+            needed = list(dict.fromkeys(d for i in todo for d in keys[i][1]))
+            index = SentenceIndex.build(zip(needed, self.retriever.get_docs(needed)))
+            for i in todo:
+                out[i] = self._select(index, queries[i], keys[i][1])
+                if cache is not None:
+                    cache.put(keys[i], out[i])
+        return out  # type: ignore[return-value]
+
+    def _select(self, index: SentenceIndex, query: str, doc_ids: Sequence[str]) -> str:
+        spans = [index.sentences_of(d) for d in doc_ids]
+        if not spans:
+            return ""
+        sents = np.concatenate([np.arange(r.start, r.stop) for r in spans])
+        rank = np.repeat(np.arange(len(spans)), [len(r) for r in spans])
+        overlap = index.query_overlap(query, sents)
+        order = np.lexsort((sents, rank, -overlap))
+        if overlap[order[0]] > 0:
+            order = order[overlap[order] > 0]
+        chosen: List[str] = []
+        sigs: List[np.ndarray] = []
+        used = 0
+        for s in sents[order].tolist():
+            text = index.sentence(s).strip()
+            n = approx_tokens(text) + (self._sep_tokens if chosen else 0)
+            if not text or used + n > self.max_tokens:
+                continue
+            sig = self.hasher.signature(text)
+            if sigs and np.mean(np.stack(sigs) == sig, axis=1).max() >= self.dedup_threshold:
+                self.duplicates_skipped += 1
+                continue
+            chosen.append(text)
+            sigs.append(sig)
+            used += n
+        if not chosen:
+            # even the best sentence is over budget: keep its head
+            head = index.sentence(int(sents[order[0]])).strip()[: 4 * self.max_tokens]
+            while approx_tokens(head) > self.max_tokens:
+                head = head[: len(head) * self.max_tokens // approx_tokens(head)]
+            return head
+        MONITOR.incr("llm.context_tokens", used)
+        return self.separator.join(chosen)
@@ -1,22 +1,216 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Tuple, Union
+import gzip
+import json
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from jsonschema import Draft7Validator
+from .monitor import MONITOR
+from .retriever import encode_docs
 
-def load_txt_corpus(dir_path: str | Path) -> Tuple[List[str], List[str]]:
-    """
-    Load all *.txt files under dir_path (non-recursive).
-    Returns (docs, ids) where ids are filenames without extension.
-    Ignores empty files.
-    """
+# (docs, ids, terms, term_ids, doc_len) for one chunk of files; see retriever.encode_docs
+EncodedChunk = Tuple[List[str], List[str], List[str], np.ndarray, np.ndarray]
+
+def _txt_files(dir_path: str | Path) -> List[Path]:
     p = Path(dir_path)
     if not p.exists() or not p.is_dir():
         raise FileNotFoundError(f"Directory not found: {dir_path}")
+    return sorted(p.glob("*.txt"))
 
+def _read_txt(files: List[Path]) -> Tuple[List[str], List[str]]:
     docs: List[str] = []
     ids: List[str] = []
-    for fp in sorted(p.glob("*.txt")):
+    for fp in files:
         text = fp.read_text(encoding="utf-8").strip()
         if text:
             docs.append(text)
             ids.append(fp.stem)
     return docs, ids
+
+@MONITOR.timed("corpus.load")
+def load_txt_corpus(dir_path: str | Path) -> Tuple[List[str], List[str]]:
+    """
+    Load all *.txt files under dir_path (non-recursive).
+    Returns (docs, ids) where ids are filenames without extension.
+    Ignores empty files.
+    """
+    return _read_txt(_txt_files(dir_path))
+
+def iter_txt_corpus(dir_path: str | Path) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily yield (id, text) for each non-empty *.txt under dir_path, in the
+    same order as load_txt_corpus, holding one document in memory at a time.
+    """
+    for fp in _txt_files(dir_path):
+        text = fp.read_text(encoding="utf-8").strip()
+        if text:
+            yield fp.stem, text
+
+def iter_encoded_chunks(
+    pairs: Iterable[Tuple[str, str]], chunk_size: int = 1000
+) -> Iterator[EncodedChunk]:
+    """Group a stream of (id, text) into encoded chunks of at most chunk_size documents."""
+    ids: List[str] = []
+    docs: List[str] = []
+    for doc_id, text in pairs:
+        ids.append(doc_id)
+        docs.append(text)
+        if len(docs) >= chunk_size:
+            yield (docs, ids, *encode_docs(docs))
+            ids, docs = [], []
+    if docs:
+        yield (docs, ids, *encode_docs(docs))
+
+def _read_and_encode(files: List[Path]) -> EncodedChunk:
+    docs, ids = _read_txt(files)
+    return (docs, ids, *encode_docs(docs))
+
+def iter_encoded_txt_chunks(
+    dir_path: str | Path, workers: int = 1, chunk_size: int = 1000
+) -> Iterator[EncodedChunk]:
+    """
+    Read and tokenize *.txt files in chunks of chunk_size files, spread over
+    `workers` processes. Chunks are yielded in file order, so feeding them to
+    BM25Retriever.add_encoded gives exactly the serial index. At most
+    2 * workers chunks are in flight, so memory stays bounded when the
+    consumer is slower than the workers.
+    """
+    files = _txt_files(dir_path)
+    chunks = [files[i : i + chunk_size] for i in range(0, len(files), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        yield from map(_read_and_encode, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_read_and_encode, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+Schema = Union[Dict[str, Any], str, Path, None]
+
+def _open_text(path: str | Path) -> IO[str]:
+    p = Path(path)
+    if p.suffix == ".gz":
+        return gzip.open(p, "rt", encoding="utf-8")
+    return p.open("r", encoding="utf-8")
+
+def _validator(schema: Schema) -> Draft7Validator | None:
+    if schema is None:
+        return None
+    if not isinstance(schema, dict):
+        schema = json.loads(Path(schema).read_text(encoding="utf-8"))
+    return Draft7Validator(schema)
+
+def _validate_batch(validator: Draft7Validator | None, records: List[Dict], first_row: int) -> None:
+    """Validate a batch of records; raise ValueError naming the first few bad rows."""
+    if validator is None:
+        return
+    problems = []
+    for i, rec in enumerate(records):
+        err = next(validator.iter_errors(rec), None)
+        if err is not None:
+            problems.append(f"row {first_row + i}: {err.message}")
+    if problems:
+        raise ValueError("Schema validation failed: " + "; ".join(problems[:5]))
+
+def _records_to_pairs(records: List[Dict], id_field: str, text_field: str) -> Iterator[Tuple[str, str]]:
+    for rec in records:
+        text = rec.get(text_field)
+        if isinstance(text, str) and text.strip():
+            yield str(rec[id_field]), text.strip()
+
+def iter_jsonl_corpus(
+    path: str | Path,
+    id_field: str = "id",
+    text_field: str = "text",
+    schema: Schema = None,
+    batch_size: int = 1000,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (id, text) from a JSONL file (optionally .gz), one object per line.
+    Records are validated against `schema` in batches of batch_size.
+    """
+    validator = _validator(schema)
+    batch: List[Dict] = []
+    first_row = 0
+    with _open_text(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                _validate_batch(validator, batch, first_row)
+                yield from _records_to_pairs(batch, id_field, text_field)
+                first_row += len(batch)
+                batch = []
+    _validate_batch(validator, batch, first_row)
+    yield from _records_to_pairs(batch, id_field, text_field)
+
+def iter_csv_corpus(
+    path: str | Path,
+    id_field: str = "id",
+    text_field: str = "text",
+    schema: Schema = None,
+    batch_size: int = 1000,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (id, text) from a CSV file (optionally compressed) in chunks of
+    batch_size rows, validating each chunk against `schema`
+    (e.g. contracts/schema.json for sample_dataset/sample.csv).
+    """
+    validator = _validator(schema)
+    first_row = 0
+    for chunk in pd.read_csv(path, chunksize=batch_size):
+        records = chunk.to_dict(orient="records")
+        _validate_batch(validator, records, first_row)
+        yield from _records_to_pairs(records, id_field, text_field)
+        first_row += len(records)
+
+def _pubmed_text(article: ET.Element) -> str:
+    title = article.find(".//ArticleTitle")
+    parts = [el for el in [title] if el is not None]
+    parts += article.iterfind(".//Abstract/AbstractText")
+    return " ".join(t for t in ("".join(el.itertext()).strip() for el in parts) if t)
+
+def iter_pubmed_xml(path: str | Path) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (PMID, title + abstract) from a PubMed baseline/update XML file
+    (usually .xml.gz) with iterparse, clearing each article once read so memory
+    stays flat. Articles without any text are skipped.
+    """
+    with (gzip.open(path, "rb") if Path(path).suffix == ".gz" else open(path, "rb")) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag != "PubmedArticle":
+                continue
+            pmid = elem.findtext("MedlineCitation/PMID")
+            text = _pubmed_text(elem)
+            if pmid and text:
+                yield pmid.strip(), text
+            elem.clear()
+            root.clear()
+
+def iter_corpus(path: str | Path, schema: Schema = None) -> Iterator[Tuple[str, str]]:
+    """
+    (id, text) stream for any supported source: a directory of *.txt files,
+    PubMed XML (.xml/.xml.gz), JSONL (.jsonl/.jsonl.gz) or CSV (.csv/.csv.gz).
+    """
+    p = Path(path)
+    if p.is_dir():
+        return iter_txt_corpus(p)
+    name = p.name.lower().removesuffix(".gz")
+    if name.endswith(".xml"):
+        return iter_pubmed_xml(p)
+    if name.endswith(".jsonl"):
+        return iter_jsonl_corpus(p, schema=schema)
+    if name.endswith(".csv"):
+        return iter_csv_corpus(p, schema=schema)
+    raise ValueError(f"Unsupported corpus source: {path}")
@@ -0,0 +1,286 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.random_projection import SparseRandomProjection
+from .retriever import _topk
+
+# texts -> (n, dim) float32 vectors; DenseRetriever L2-normalizes them
+Encoder = Callable[[List[str]], np.ndarray]
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+class HashingEncoder:
+    """
+    Stateless encoder: hashed word uni/bigram counts (sublinear tf) reduced to
+    `dim` dimensions with a fixed sparse random projection. Deterministic for a
+    given seed and needs no fitting, so documents can be added at any time.
+    """
+    def __init__(self, dim: int = 256, n_features: int = 1 << 18, seed: int = 0) -> None:
+        self.dim = dim
+        self._vec = HashingVectorizer(
+            n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm=None
+        )
+        self._proj = SparseRandomProjection(n_components=dim, dense_output=True, random_state=seed)
+        self._proj.fit(sparse.csr_matrix((1, n_features)))
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        x = self._vec.transform(texts)
+        x.data = np.log1p(x.data)
+        return np.asarray(self._proj.transform(x), dtype=np.float32)
+
+class TfidfSvdEncoder:
+    """
+    Latent semantic encoder: TF-IDF followed by truncated SVD, fitted once on a
+    corpus sample. Co-occurring terms share dimensions, so paraphrases that use
+    related vocabulary land close together.
+    """
+    def __init__(self, dim: int = 128, seed: int = 0) -> None:
+        self.dim = dim
+        self._tfidf = TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2), min_df=1)
+        self._svd = TruncatedSVD(n_components=dim, random_state=seed)
+
+    def fit(self, texts: List[str]) -> TfidfSvdEncoder:
+        x = self._tfidf.fit_transform(texts)
+        self._svd.n_components = max(1, min(self.dim, x.shape[1] - 1, x.shape[0] - 1))
+        self._svd.fit(x)
+        return self
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self._svd.transform(self._tfidf.transform(texts)), dtype=np.float32)
+
+class _VectorStore:
+    """Growable float32 (n, dim) matrix, memory-mapped from `path` when given."""
+    def __init__(self, dim: int, path: str | Path | None = None) -> None:
+        self.dim = dim
+        self.path = Path(path) if path is not None else None
+        self._n = 0
+        self._data = self._alloc(16)
+
+    def _alloc(self, capacity: int) -> np.ndarray:
+        if self.path is None:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        return np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[: self._n]
+
+    def extend(self, vecs: np.ndarray) -> None:
+        n = self._n + len(vecs)
+        if n > len(self._data):
+            capacity = max(n, 2 * len(self._data))
+            if self.path is None:
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[: self._n] = self.view
+                self._data = grown
+            elif isinstance(self._data, np.memmap):
+                self._data.flush()
+                del self._data
+                self._data = self._alloc(capacity)  # the file grows in place
+        self._data[self._n : n] = vecs
+        self._n = n
+
+    def flush(self) -> None:
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
+
+def _spherical_kmeans(
+    x: np.ndarray, n_lists: int, iters: int, seed: int, block: int
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, centroids, block)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]  # reseed empty lists
+        centroids = _normalize(sums)
+    return centroids
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, block: int) -> np.ndarray:
+    out = np.empty(len(x), dtype=np.int32)
+    for lo in range(0, len(x), block):
+        out[lo : lo + block] = np.argmax(x[lo : lo + block] @ centroids.T, axis=1)
+    return out
+
+class DenseRetriever:
+    """
+    Cosine-similarity retriever over L2-normalized embeddings, with the same
+    add/query/get_doc(s)/query_batch interface as BM25Retriever.
+    Exact search is a blocked matrix multiply (block_rows vectors at a time);
+    after build_ivf(), queries with nprobe probe only that many k-means lists.
+    """
+    def __init__(
+        self,
+        encoder: Encoder | None = None,
+        path: str | Path | None = None,
+        block_rows: int = 1 << 16,
+    ) -> None:
+        self.encoder = encoder or HashingEncoder()
+        self.block_rows = block_rows
+        self.nprobe: int | None = None  # default for queries once build_ivf() has run
+        self._path = path
+        self._vectors: _VectorStore | None = None
+        self._docs: List[str] = []
+        self._doc_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._centroids: np.ndarray | None = None
+        self._assign: List[np.ndarray] = []
+        self._lists: Tuple[np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._row_of
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors.view if self._vectors is not None else np.zeros((0, 0), np.float32)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return _normalize(self.encoder(texts))
+
+    def add(self, docs: List[str], ids: List[str] | None = None) -> None:
+        if ids is None:
+            ids = [str(i) for i in range(len(self._docs), len(self._docs) + len(docs))]
+        if len(ids) != len(docs):
+            raise ValueError("ids and docs must have same length")
+        if len(set(ids)) != len(ids) or any(i in self._row_of for i in ids):
+            raise ValueError("doc ids must be unique")
+        if not docs:
+            return
+        vecs = self._encode(list(docs))
+        if self._vectors is None:
+            self._vectors = _VectorStore(vecs.shape[1], self._path)
+        start = len(self._docs)
+        self._vectors.extend(vecs)
+        self._docs.extend(docs)
+        self._doc_ids.extend(ids)
+        self._row_of.update((i, start + j) for j, i in enumerate(ids))
+        if self._centroids is not None:
+            self._assign.append(_nearest(vecs, self._centroids, self.block_rows))
+            self._lists = None
+
+    def build_ivf(
+        self, n_lists: int | None = None, iters: int = 10, sample: int = 100_000, seed: int = 0
+    ) -> None:
+        """Train the coarse quantizer (spherical k-means, default ~sqrt(N) lists) and assign every vector."""
+        x = self.vectors
+        if len(x) == 0:
+            raise ValueError("add documents before building the IVF index")
+        n_lists = max(1, min(n_lists or int(np.sqrt(len(x))), len(x)))
+        rng = np.random.default_rng(seed)
+        train = x if len(x) <= sample else x[np.sort(rng.choice(len(x), sample, replace=False))]
+        self._centroids = _spherical_kmeans(np.asarray(train), n_lists, iters, seed, self.block_rows)
+        self._assign = [_nearest(x, self._centroids, self.block_rows)]
+        self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._lists is None:
+            assert self._centroids is not None, "build_ivf() first"
+            n_lists = len(self._centroids)
+            assign = np.concatenate(self._assign)
+            order = np.argsort(assign, kind="stable").astype(np.int64)
+            ptr = np.zeros(n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assign, minlength=n_lists), out=ptr[1:])
+            self._lists = (ptr, order)
+        return self._lists
+
+    def _search(self, q: np.ndarray, k: int, nprobe: int | None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, scores) shaped (len(q), min(k, N)), best first, ties to the lower row.
+        nprobe=None uses self.nprobe; 0 (or no IVF index) searches exactly.
+        """
+        if nprobe is None:
+            nprobe = self.nprobe
+        n = len(self)
+        k = max(0, min(k, n))
+        out_rows = np.zeros((len(q), k), dtype=np.int64)
+        out_scores = np.zeros((len(q), k), dtype=np.float32)
+        if k == 0 or len(q) == 0:
+            return out_rows, out_scores
+        x = self.vectors
+        if not nprobe or self._centroids is None or nprobe >= len(self._centroids):
+            best_rows = np.zeros((len(q), 0), dtype=np.int64)
+            best_scores = np.zeros((len(q), 0), dtype=np.float32)
+            for lo in range(0, n, self.block_rows):
+                block = q @ x[lo : lo + self.block_rows].T
+                rows = np.arange(lo, lo + block.shape[1])
+                cand_rows = np.hstack([best_rows, np.broadcast_to(rows, block.shape)])
+                cand_scores = np.hstack([best_scores, block])
+                keep = [_topk(s, k) for s in cand_scores]
+                best_rows = np.take_along_axis(cand_rows, np.array(keep), axis=1)
+                best_scores = np.take_along_axis(cand_scores, np.array(keep), axis=1)
+            return best_rows, best_scores
+        ptr, order = self._inverted_lists()
+        probes = np.argsort(-(q @ self._centroids.T), axis=1, kind="stable")[:, :nprobe]
+        out_rows = np.full((len(q), k), -1, dtype=np.int64)
+        out_scores = np.full((len(q), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            cand = np.sort(np.concatenate([order[ptr[c] : ptr[c + 1]] for c in lists]))
+            scores = x[cand] @ q[i]
+            best = _topk(scores, k)
+            out_rows[i, : len(best)] = cand[best]
+            out_scores[i, : len(best)] = scores[best]
+        return out_rows, out_scores
+
+    def query_rows(self, text: str, k: int = 3, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        rows, scores = self._search(self._encode([text]), k, nprobe)
+        keep = rows[0] >= 0  # IVF may find fewer than k candidates
+        return rows[0][keep], scores[0][keep]
+
+    def query_batch(
+        self, queries: List[str], k: int = 3, nprobe: int | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) shaped (len(queries), min(k, N)); IVF misses are row -1 / -inf."""
+        if not queries:
+            return self._search(np.zeros((0, 1), np.float32), k, nprobe)
+        return self._search(self._encode(list(queries)), k, nprobe)
+
+    def query(self, text: str, k: int = 3, nprobe: int | None = None) -> List[Tuple[str, float]]:
+        rows, scores = self.query_rows(text, k=k, nprobe=nprobe)
+        return [(self._doc_ids[i], s) for i, s in zip(rows.tolist(), scores.tolist())]
+
+    def get_doc(self, doc_id: str) -> str:
+        return self._docs[self._row_of[doc_id]]
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        return [self._docs[self._row_of[i]] for i in ids]
+
+    def iter_docs(self) -> Iterable[Tuple[str, str]]:
+        return zip(self._doc_ids, self._docs)
+
+    def row_of(self, doc_id: str) -> int:
+        return self._row_of[doc_id]
+
+    def doc_at(self, row: int) -> str:
+        return self._docs[row]
+
+    def id_at(self, row: int) -> str:
+        return self._doc_ids[row]
+
+    @classmethod
+    def from_pairs(
+        cls, pairs: Iterable[Tuple[str, str]], encoder: Encoder | None = None, **kwargs
+    ) -> DenseRetriever:
+        """Build from (id, text) pairs, e.g. BM25Retriever.iter_docs()."""
+        pairs = list(pairs)
+        r = cls(encoder=encoder, **kwargs)
+        r.add([t for _, t in pairs], ids=[i for i, _ in pairs])
+        return r
@@ -1,29 +1,77 @@
 from __future__ import annotations
-from typing import List, Dict, Tuple, Set
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple, Set
 import re
+import time
+import numpy as np
+from scipy import sparse
+from .containment import containment_matrix
+from .impact import PrunedRetriever
+from .monitor import MONITOR
+from .retriever import _tokenize
+
+Results = List[List[Tuple[str, float]]]
+
+@MONITOR.timed("eval.retrieve")
+def retrieve_all(questions: Iterable[str], retriever, k: int = 3) -> Results:
+    """
+    Top-k (doc_id, score) lists for every question, in order.
+    Uses the retriever's query_batch() when it has one, otherwise one
+    query() per question. For BM25Retriever, query_batch() is a per-query
+    loop of MaxScore-pruned top-k, so it is not faster than looping
+    query(prune=True) yourself. Negative rows (an approximate search that
+    found fewer than k) are dropped.
+    """
+    questions = list(questions)
+    if hasattr(retriever, "query_batch"):
+        rows, scores = retriever.query_batch(questions, k=k)
+        return [
+            [(retriever.id_at(r), s) for r, s in zip(rr, ss) if r >= 0]
+            for rr, ss in zip(rows.tolist(), scores.tolist())
+        ]
+    return [retriever.query(q, k=k) for q in questions]
+
+def _results_for(qa_pairs, retriever, k: int, results: Optional[Results]) -> Results:
+    if results is None:
+        return retrieve_all((q for q, _ in qa_pairs), retriever, k=k)
+    assert len(results) == len(qa_pairs), "qa_pairs and results must align"
+    return [res[:k] for res in results]
+
+@MONITOR.timed("eval.containment")
+def answer_containment(
+    qa_pairs: List[Tuple[str, str]],
+    retriever,
+    k: int = 3,
+    results: Optional[Results] = None,
+) -> np.ndarray:
+    """
+    (len(qa_pairs), k) flags: the j-th retrieved doc for question i contains its
+    expected answer (case-insensitive). Compute once and pass as `contains` to
+    context_hit_rate and retrieval_precision_at_k to share it.
+    """
+    answers = [answer for _, answer in qa_pairs]
+    return containment_matrix(answers, _results_for(qa_pairs, retriever, k, results), retriever, k)
+
+def _contains_for(qa_pairs, retriever, k, results, contains) -> np.ndarray:
+    if contains is None:
+        return answer_containment(qa_pairs, retriever, k, results)
+    assert len(contains) == len(qa_pairs), "qa_pairs and contains must align"
+    return contains[:, :k]
 
 def context_hit_rate(
     qa_pairs: List[Tuple[str, str]],  # (question, expected_answer_substring)
     retriever,
     k: int = 3,
+    results: Optional[Results] = None,
+    contains: Optional[np.ndarray] = None,
 ) -> Dict[str, float]:
     """
     For each QA pair, check if any of the top-k retrieved docs
     contains the expected answer substring (case-insensitive).
+    `results` may hold precomputed retrieve_all() output (at least k deep),
+    `contains` a precomputed answer_containment() matrix (at least k wide).
     Returns {"hit_rate": float}
     """
-    hits = 0
-    for q, answer in qa_pairs:
-        results = retriever.query(q, k=k)
-        if not results:
-            continue
-        for doc_id, _ in results:
-            # we don't store docs inside retriever here, so assume retriever has docs list
-            idx = retriever._doc_ids.index(doc_id)
-            doc_text = retriever._docs[idx]
-            if answer.lower() in doc_text.lower():
-                hits += 1
-                break
+    hits = int(_contains_for(qa_pairs, retriever, k, results, contains).any(axis=1).sum())
     total = len(qa_pairs)
     return {"hit_rate": hits / total if total > 0 else 0.0}
 
@@ -31,29 +79,21 @@ def retrieval_precision_at_k(
     qa_pairs: List[Tuple[str, str]],
     retriever,
     k: int = 3,
+    results: Optional[Results] = None,
+    contains: Optional[np.ndarray] = None,
 ) -> Dict[str, float]:
     """
     For each QA pair, count how many of the top-k retrieved docs contain the expected
     answer substring (case-insensitive). Average that fraction across all QA pairs.
+    `results` / `contains` may hold precomputed retrieval and containment (see context_hit_rate).
     Returns {"precision_at_k": float}
     """
 
     if k <= 0:
         return {"precision_at_k": 0.0}
 
-    precisions: List[float] = []
-    for q, answer in qa_pairs:
-        results = retriever.query(q, k=k)
-        if not results:
-            precisions.append(0.0)
-            continue
-        hits = 0
-        for doc_id, _ in results:
-            idx = retriever._doc_ids.index(doc_id)
-            doc_text = retriever._docs[idx]
-            if answer.lower() in doc_text.lower():
-                hits += 1
-        precisions.append(hits / k)
+    hits = _contains_for(qa_pairs, retriever, k, results, contains).sum(axis=1)
+    precisions = [h / k for h in hits.tolist()]
     # average over all QA pairs
     return {"precision_at_k": sum(precisions) / len(precisions) if precisions else 0.0}
 
@@ -67,36 +107,181 @@ _STOPWORDS: Set[str] = {
 def _tokens(text: str) -> Set[str]:
     return {t for t in _WORD.findall(text.lower()) if t not in _STOPWORDS}
 
+def _faithful_flags(
+    candidates: List[str], per_q: Results, retriever, width: int, threshold: float
+) -> np.ndarray:
+    """
+    (len(candidates), width) flags: candidate i overlaps its j-th retrieved doc by
+    >= threshold. With a retriever that exposes doc_terms() (cached per-document
+    token sets), all pairs are scored in one sparse intersection and no document
+    is re-tokenized; otherwise each distinct document is tokenized once.
+    """
+    n = len(candidates)
+    flags = np.zeros((n, width), dtype=np.bool_)
+    cand_toks = [_tokens(c) for c in candidates]
+    sizes = np.array([len(t) for t in cand_toks], dtype=np.float64)
+    pairs = [
+        (i, j, doc_id)
+        for i, ranked in enumerate(per_q) if cand_toks[i]
+        for j, (doc_id, _) in enumerate(ranked[:width])
+    ]
+    if not pairs:
+        return flags
+    qi = np.array([p[0] for p in pairs])
+    pos = np.array([p[1] for p in pairs])
+    if hasattr(retriever, "doc_terms"):
+        doc_terms, vocab = retriever.doc_terms()
+        indptr = [0]
+        cols: List[int] = []
+        for toks in cand_toks:
+            cols.extend(vocab[t] for t in toks if t in vocab)
+            indptr.append(len(cols))
+        cand_terms = sparse.csr_matrix(
+            (np.ones(len(cols), dtype=np.int32), cols, indptr), shape=(n, doc_terms.shape[1])
+        )
+        rows = np.array([retriever.row_of(doc_id) for _, _, doc_id in pairs])
+        inter = np.asarray(doc_terms[rows].multiply(cand_terms[qi]).sum(axis=1)).ravel()
+    else:
+        memo: Dict[str, Set[str]] = {}
+        texts = retriever.get_docs([doc_id for _, _, doc_id in pairs])
+        inter = np.array([
+            len(cand_toks[i] & (memo[d] if d in memo else memo.setdefault(d, _tokens(t))))
+            for (i, _, d), t in zip(pairs, texts)
+        ])
+    flags[qi, pos] = inter / sizes[qi] >= threshold
+    return flags
+
+@MONITOR.timed("eval.faithfulness")
 def faithfulness_overlap(
     qa_pairs: List[Tuple[str, str]],
     candidates: List[str],
     retriever,
     k: int = 3,
     threshold: float = 0.6,
+    results: Optional[Results] = None,
 ) -> Dict[str, float]:
     """
     For each (Q,A*) + candidate answer C:
-      - retrieve top-k docs for Q
+      - retrieve top-k docs for Q (or take them from precomputed `results`)
       - compute Jaccard-like overlap: |tokens(C) ∩ tokens(doc)| / |tokens(C)|
       - if any doc reaches >= threshold, count as faithful
     Returns {"faithfulness": mean_faithful_rate}
     """
     assert len(qa_pairs) == len(candidates), "qa_pairs and candidates must align"
-    faithful = 0
     total = len(qa_pairs)
-    for (q, _), cand in zip(qa_pairs, candidates):
-        results = retriever.query(q, k=k)
-        cand_toks = _tokens(cand)
-        if not cand_toks or not results:
-            continue
-        ok = False
-        for doc_id, _ in results:
-            idx = retriever._doc_ids.index(doc_id)
-            doc_toks = _tokens(retriever._docs[idx])
-            overlap = len(cand_toks & doc_toks) / max(1, len(cand_toks))
-            if overlap >= threshold:
-                ok = True
-                break
-        if ok:
-            faithful += 1
+    per_q = _results_for(qa_pairs, retriever, k, results)
+    faithful = int(_faithful_flags(candidates, per_q, retriever, k, threshold).any(axis=1).sum())
     return {"faithfulness": (faithful / total) if total > 0 else 0.0}
+
+@MONITOR.timed("eval.multi_k")
+def evaluate_multi_k(
+    qa_pairs: List[Tuple[str, str]],
+    candidates: List[str],
+    retriever,
+    max_k: int = 3,
+    threshold: float = 0.6,
+    results: Optional[Results] = None,
+) -> List[Dict[str, float]]:
+    """
+    hit_rate, precision_at_k and faithfulness for every k in 1..max_k from a single
+    top-max_k retrieval pass. Per-document answer-containment and faithfulness flags
+    are computed once; metrics for each k come from prefixes of those flags.
+    Returns one dict per k, equal to calling the three metric functions at that k.
+    """
+    assert len(qa_pairs) == len(candidates), "qa_pairs and candidates must align"
+    per_q = _results_for(qa_pairs, retriever, max_k, results)
+    n = len(qa_pairs)
+    contains = containment_matrix([a for _, a in qa_pairs], per_q, retriever, max_k)
+    faithful = _faithful_flags(candidates, per_q, retriever, max_k, threshold)
+    ks = np.arange(1, max_k + 1)
+    hit = np.logical_or.accumulate(contains, axis=1).sum(axis=0)
+    prec = (np.cumsum(contains, axis=1) / ks).sum(axis=0)
+    faith = np.logical_or.accumulate(faithful, axis=1).sum(axis=0)
+    denom = n if n > 0 else 1
+    return [
+        {
+            "k": int(k),
+            "hit_rate": float(hit[k - 1]) / denom,
+            "precision_at_k": float(prec[k - 1]) / denom,
+            "faithfulness": float(faith[k - 1]) / denom,
+        }
+        for k in ks
+    ]
+
+def ann_recall_latency(
+    questions: Iterable[str],
+    retriever,
+    k: int = 10,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+) -> List[Dict[str, float]]:
+    """
+    Recall-vs-latency of approximate search for a retriever whose query_batch
+    takes nprobe (e.g. DenseRetriever after build_ivf()). recall_at_k is the
+    overlap with exact top-k; the first row (nprobe=0) is the exact baseline.
+    """
+    questions = list(questions)
+    n_q = max(1, len(questions))
+    t0 = time.perf_counter()
+    exact, _ = retriever.query_batch(questions, k=k, nprobe=0)
+    rows = [{"nprobe": 0, "recall_at_k": 1.0, "ms_per_query": (time.perf_counter() - t0) * 1000 / n_q}]
+    truth = [set(r) for r in exact.tolist()]
+    for nprobe in nprobes:
+        t0 = time.perf_counter()
+        approx, _ = retriever.query_batch(questions, k=k, nprobe=nprobe)
+        ms = (time.perf_counter() - t0) * 1000 / n_q
+        found = sum(len(t & set(a)) for t, a in zip(truth, approx.tolist()))
+        total = sum(len(t) for t in truth)
+        rows.append({"nprobe": nprobe, "recall_at_k": found / total if total else 1.0, "ms_per_query": ms})
+    return rows
+
+def pruning_tradeoff(
+    qa_pairs: List[Tuple[str, str]],
+    retriever,
+    k: int = 3,
+    budgets: Sequence[float] = (1.0, 0.5, 0.25, 0.1),
+) -> List[Dict[str, Optional[float]]]:
+    """
+    Quality loss vs speedup of impact-ordered, statically pruned BM25 (see
+    impact.PrunedRetriever) for a BM25Retriever. The first row (budget=None) is
+    exhaustive scoring; every row has hit_rate and precision_at_k, their loss
+    against that baseline, ms_per_query, speedup and postings scored per query.
+    """
+    questions = [q for q, _ in qa_pairs]
+    n_q = max(1, len(questions))
+
+    def measure(search) -> Tuple[Results, float]:
+        t0 = time.perf_counter()
+        results = [search(q) for q in questions]
+        return results, (time.perf_counter() - t0) * 1000 / n_q
+
+    def quality(results: Results) -> Tuple[float, float]:
+        contains = answer_containment(qa_pairs, retriever, k, results)
+        hit = context_hit_rate(qa_pairs, retriever, k, contains=contains)["hit_rate"]
+        prec = retrieval_precision_at_k(qa_pairs, retriever, k, contains=contains)["precision_at_k"]
+        return hit, prec
+
+    idx = retriever.index
+    full = sum(int(idx.df[idx.vocab[t]]) for q in questions for t in _tokenize(q) if t in idx.vocab)
+    results, base_ms = measure(lambda q: retriever.query(q, k=k))
+    base_hit, base_prec = quality(results)
+    rows = [{
+        "budget": None, "postings_kept": 1.0, "hit_rate": base_hit, "precision_at_k": base_prec,
+        "hit_rate_loss": 0.0, "precision_loss": 0.0, "ms_per_query": base_ms, "speedup": 1.0,
+        "postings_per_query": full / n_q,
+    }]
+    for budget in budgets:
+        pruned = PrunedRetriever(retriever, budget=budget)
+        results, ms = measure(lambda q: pruned.query(q, k=k))
+        hit, prec = quality(results)
+        rows.append({
+            "budget": budget,
+            "postings_kept": pruned.impact_index().kept_fraction,
+            "hit_rate": hit,
+            "precision_at_k": prec,
+            "hit_rate_loss": base_hit - hit,
+            "precision_loss": base_prec - prec,
+            "ms_per_query": ms,
+            "speedup": base_ms / ms if ms > 0 else float("inf"),
+            "postings_per_query": pruned.postings_scored / n_q,
+        })
+    return rows
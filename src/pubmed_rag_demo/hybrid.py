@@ -0,0 +1,125 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from .eval import retrieve_all
+
+Ranked = List[Tuple[str, float]]
+
+def rrf_fuse(lists: Sequence[Ranked], weights: Sequence[float], rrf_k: float = 60.0) -> Dict[str, float]:
+    """Reciprocal-rank fusion: sum of w / (rrf_k + rank) over the lists a doc appears in."""
+    fused: Dict[str, float] = {}
+    for ranked, w in zip(lists, weights):
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + w / (rrf_k + rank)
+    return fused
+
+def weighted_fuse(lists: Sequence[Ranked], weights: Sequence[float]) -> Dict[str, float]:
+    """Weighted sum of per-list min-max normalized scores (a constant list scores 1)."""
+    fused: Dict[str, float] = {}
+    for ranked, w in zip(lists, weights):
+        if not ranked:
+            continue
+        scores = np.array([s for _, s in ranked], dtype=np.float64)
+        lo, hi = scores.min(), scores.max()
+        norm = (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+        for (doc_id, _), s in zip(ranked, norm.tolist()):
+            fused[doc_id] = fused.get(doc_id, 0.0) + w * s
+    return fused
+
+class HybridRetriever:
+    """
+    Fuses several retrievers over the same corpus (e.g. BM25Retriever and
+    DenseRetriever). Each sub-retriever fetches fetch_k candidates per query on
+    its own thread (scoring is NumPy, which releases the GIL), then results are
+    fused with reciprocal-rank fusion ("rrf") or weighted min-max scores
+    ("weighted"). Documents are addressed through the first retriever, so
+    eval/leaderboard can use it like any other retriever.
+    """
+    def __init__(
+        self,
+        retrievers: Sequence,
+        fusion: str = "rrf",
+        weights: Sequence[float] | None = None,
+        fetch_k: int = 50,
+        rrf_k: float = 60.0,
+    ) -> None:
+        if not retrievers:
+            raise ValueError("need at least one retriever")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"unknown fusion: {fusion!r} (use 'rrf' or 'weighted')")
+        if weights is not None and len(weights) != len(retrievers):
+            raise ValueError("weights and retrievers must have same length")
+        self.retrievers = list(retrievers)
+        self.fusion = fusion
+        self.weights = list(weights) if weights is not None else [1.0] * len(self.retrievers)
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        self._pool = ThreadPoolExecutor(max_workers=len(self.retrievers), thread_name_prefix="hybrid")
+        # rows are the primary's, so its cached per-document data applies as is
+        for name in ("doc_terms", "get_docs_lower"):
+            if hasattr(self.primary, name):
+                setattr(self, name, getattr(self.primary, name))
+
+    @property
+    def primary(self):
+        return self.retrievers[0]
+
+    def __len__(self) -> int:
+        return len(self.primary)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.primary
+
+    def _fuse(self, lists: Sequence[Ranked], k: int) -> Ranked:
+        if self.fusion == "rrf":
+            fused = rrf_fuse(lists, self.weights, self.rrf_k)
+        else:
+            fused = weighted_fuse(lists, self.weights)
+        # best first; ties go to the lower row of the primary retriever
+        order = sorted(fused.items(), key=lambda item: (-item[1], self.primary.row_of(item[0])))
+        return order[:k]
+
+    def query_all(self, queries: Iterable[str], k: int = 3) -> List[Ranked]:
+        """Fused top-k (doc_id, score) for every query; sub-retrievers run concurrently."""
+        queries = list(queries)
+        depth = max(k, self.fetch_k)
+        futures = [self._pool.submit(retrieve_all, queries, r, depth) for r in self.retrievers]
+        per_retriever = [f.result() for f in futures]
+        return [self._fuse(lists, k) for lists in zip(*per_retriever)]
+
+    def query(self, text: str, k: int = 3) -> Ranked:
+        return self.query_all([text], k)[0]
+
+    def query_batch(self, queries: List[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) in the primary retriever's row space, padded with -1 / -inf."""
+        fused = self.query_all(queries, k)
+        width = max([len(f) for f in fused], default=0)
+        rows = np.full((len(queries), width), -1, dtype=np.int64)
+        scores = np.full((len(queries), width), -np.inf)
+        for i, ranked in enumerate(fused):
+            for j, (doc_id, s) in enumerate(ranked):
+                rows[i, j] = self.primary.row_of(doc_id)
+                scores[i, j] = s
+        return rows, scores
+
+    def get_doc(self, doc_id: str) -> str:
+        return self.primary.get_doc(doc_id)
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        return self.primary.get_docs(ids)
+
+    def row_of(self, doc_id: str) -> int:
+        return self.primary.row_of(doc_id)
+
+    def id_at(self, row: int) -> str:
+        return self.primary.id_at(row)
+
+    def doc_at(self, row: int) -> str:
+        return self.primary.doc_at(row)
+
+    def iter_docs(self) -> Iterable[Tuple[str, str]]:
+        return self.primary.iter_docs()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
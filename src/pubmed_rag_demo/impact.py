@@ -0,0 +1,202 @@
+"""
+Impact-ordered BM25 postings with optional static pruning.
+
+Each term's postings are sorted by their precomputed BM25 contribution
+(idf * saturated tf), highest first. Static pruning keeps only the highest
+impact postings within a budget. Queries walk postings a block at a time,
+highest impact first across all query terms, and stop once no unvisited
+posting can change which documents make the top k; the survivors are then
+scored exactly against the full index.
+"""
+from __future__ import annotations
+import heapq
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from .retriever import BM25Retriever, InvertedIndex, _merge_segments, _tokenize, _topk
+
+class ImpactIndex:
+    """Per-term postings in descending impact order (CSR: indptr, rows, impacts)."""
+    def __init__(self, indptr: np.ndarray, rows: np.ndarray, impacts: np.ndarray, n_rows: int, n_postings: int) -> None:
+        self.indptr = indptr
+        self.rows = rows
+        self.impacts = impacts
+        self.n_rows = n_rows
+        self.n_postings = n_postings  # before pruning
+
+    @classmethod
+    def build(cls, index: InvertedIndex, budget: float = 1.0, min_keep: int = 16) -> ImpactIndex:
+        """
+        Impact-order the live postings of `index`. With budget < 1 only that
+        fraction of all postings is kept: the globally highest impacts, but never
+        fewer than min_keep per term, so rare terms stay searchable.
+        """
+        if not 0.0 < budget <= 1.0:
+            raise ValueError("budget must be in (0, 1]")
+        index._refresh()
+        n_terms = len(index.vocab)
+        if index.segments:
+            seg = _merge_segments(index.segments, n_terms, index.live)
+            term, rows, tf = seg.term_of_postings(), seg.post_rows, seg.tfs
+        else:
+            term, rows, tf = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        imp = index.idf[term] * (tf * (index.k1 + 1) / (tf + index.norm[rows]))
+        # by term, then descending impact; equal impacts keep row order
+        order = np.lexsort((rows, -imp, term))
+        term, rows, imp = term[order], rows[order], imp[order]
+        n = len(rows)
+        starts = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term, minlength=n_terms), out=starts[1:])
+        if budget < 1.0:
+            keep = np.arange(n) - starts[term] < min_keep
+            extra = int(budget * n) - int(keep.sum())
+            if extra > 0:
+                free = np.flatnonzero(~keep)
+                if extra < len(free):
+                    free = free[np.argpartition(-imp[free], extra - 1)[:extra]]
+                keep[free] = True
+            term, rows, imp = term[keep], rows[keep], imp[keep]
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term, minlength=n_terms), out=indptr[1:])
+        return cls(indptr, rows, imp, index.n_rows, n)
+
+    @property
+    def kept_fraction(self) -> float:
+        return len(self.rows) / self.n_postings if self.n_postings else 1.0
+
+    def candidates(self, counts: Dict[int, int], k: int, block: int = 256) -> Tuple[np.ndarray, int]:
+        """
+        Sorted rows that hold the top k under this index's postings, and the
+        number of postings scored. Blocks are taken highest impact first, each
+        term's blocks doubling in size as its impacts flatten out. Periodically,
+        if the k-th accumulated score beats the (k+1)-th plus the sum of every
+        term's next impact, membership can no longer change and the walk stops
+        early. Impacts must be non-negative; terms whose impacts are
+        all zero cannot change any score and are skipped.
+        """
+        indptr, rows, imp = self.indptr, self.rows, self.impacts
+        acc = np.zeros(self.n_rows)
+        heads = [
+            (-m * imp[indptr[t]], t, int(indptr[t]), block)
+            for t, m in counts.items() if indptr[t] < indptr[t + 1] and imp[indptr[t]] > 0
+        ]
+        heapq.heapify(heads)
+        touched: List[np.ndarray] = []
+        scored = 0
+        next_check = block
+        while heads:
+            _, t, lo, size = heapq.heappop(heads)
+            end = int(indptr[t + 1])
+            hi = min(lo + size, end)
+            r = rows[lo:hi]
+            touched.append(r[acc[r] == 0])  # impacts are positive, so 0 means unseen
+            acc[r] += counts[t] * imp[lo:hi]
+            scored += hi - lo
+            if hi < end:
+                heapq.heappush(heads, (-counts[t] * imp[hi], t, hi, 2 * size))
+            if scored >= next_check and heads:
+                cand = np.concatenate(touched)
+                touched = [cand]
+                next_check = scored + max(block, len(cand) // 2)
+                if len(cand) < k:
+                    continue
+                vals = np.partition(acc[cand], len(cand) - k)
+                kth = vals[len(cand) - k]
+                runner_up = vals[: len(cand) - k].max() if len(cand) > k else 0.0
+                remaining = sum(-h[0] for h in heads)
+                if runner_up + remaining < kth - 1e-9 * max(1.0, abs(kth)):
+                    break
+        cand = np.concatenate(touched) if touched else np.zeros(0, dtype=np.int32)
+        if len(cand) > k:
+            vals = acc[cand]
+            kth = float(np.partition(vals, len(vals) - k)[len(vals) - k])
+            cand = cand[vals >= kth - 1e-9 * max(1.0, abs(kth))]
+        return np.sort(cand).astype(np.int64), scored
+
+class PrunedRetriever:
+    """
+    Answers query/query_rows/query_batch for a BM25Retriever from an impact
+    ordered, optionally pruned, copy of its postings. Returned scores are exact
+    BM25; with budget=1.0 the results equal the base retriever's, and only
+    pruning (budget < 1) can change which documents are returned. The impact
+    index is rebuilt when the base retriever changes.
+    """
+    def __init__(self, base: BM25Retriever, budget: float = 1.0, min_keep: int = 16, block: int = 256) -> None:
+        self.base = base
+        self.budget = budget
+        self.min_keep = min_keep
+        self.block = block
+        self.postings_scored = 0
+        self._impact: ImpactIndex | None = None
+        self._built_version = -1
+        self.impact_index()
+
+    def impact_index(self) -> ImpactIndex:
+        if self._impact is None or self._built_version != self.base.version:
+            self._impact = ImpactIndex.build(self.base.index, self.budget, self.min_keep)
+            self._built_version = self.base.version
+        return self._impact
+
+    def query_rows(self, text: str, k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        impact = self.impact_index()
+        idx = self.base.index
+        k = max(0, min(k, idx.n_live))
+        toks = _tokenize(text)
+        counts: Dict[int, int] = {}
+        for t in toks:
+            tid = idx.vocab.get(t)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        if any(idx.idf[t] < 0 for t in counts):
+            return idx.top_k(toks, k)  # negative impacts void the early-exit bound
+        cand, scored = impact.candidates(counts, k, self.block)
+        self.postings_scored += scored
+        if len(cand) < k:
+            # fewer than k matches: pad with the lowest unmatched live rows, as exhaustive top-k does
+            free = idx.live.copy()
+            free[cand] = False
+            cand = np.sort(np.concatenate([cand, np.flatnonzero(free)[: k - len(cand)]]))
+        scores = idx._score_rows(toks, cand)
+        best = _topk(scores, k)
+        return cand[best], scores[best]
+
+    def query_batch(self, queries: List[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        width = max(0, min(k, self.base.index.n_live))
+        rows = np.zeros((len(queries), width), dtype=np.int64)
+        scores = np.zeros((len(queries), width))
+        for i, q in enumerate(queries):
+            rows[i], scores[i] = self.query_rows(q, k)
+        return rows, scores
+
+    def query(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
+        rows, scores = self.query_rows(text, k=k)
+        return [(self.base.id_at(i), s) for i, s in zip(rows.tolist(), scores.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.base
+
+    def id_at(self, row: int) -> str:
+        return self.base.id_at(row)
+
+    def row_of(self, doc_id: str) -> int:
+        return self.base.row_of(doc_id)
+
+    def doc_at(self, row: int) -> str:
+        return self.base.doc_at(row)
+
+    def get_doc(self, doc_id: str) -> str:
+        return self.base.get_doc(doc_id)
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        return self.base.get_docs(ids)
+
+    def get_docs_lower(self, ids: Iterable[str]) -> List[str]:
+        return self.base.get_docs_lower(ids)
+
+    def doc_terms(self):
+        return self.base.doc_terms()
+
+    def iter_docs(self) -> Iterable[Tuple[str, str]]:
+        return self.base.iter_docs()
@@ -1,14 +1,360 @@
 from __future__ import annotations
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 from pathlib import Path
-from typing import List, Tuple
-from .corpus import load_txt_corpus
-from .retriever import BM25Retriever
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from .corpus import (
+    EncodedChunk,
+    Schema,
+    iter_corpus,
+    iter_encoded_chunks,
+    iter_encoded_txt_chunks,
+    load_txt_corpus,
+)
+from .retriever import BM25Retriever, InvertedIndex, _build_postings
 
-def build_bm25_from_dir(dir_path: str | Path) -> BM25Retriever:
-    docs, ids = load_txt_corpus(dir_path)
+INDEX_FORMAT = "pubmed-rag-bm25"
+INDEX_VERSION = 1
+DEFAULT_INDEX_DIRNAME = ".bm25_index"
+
+_ARRAYS = ("indptr", "post_rows", "tfs", "doc_len", "df", "doc_offsets")
+
+def build_bm25_from_dir(dir_path: str | Path, workers: int = 1) -> BM25Retriever:
+    """Index every *.txt in dir_path; workers > 1 reads and tokenizes in a process pool."""
     r = BM25Retriever()
-    r.add(docs, ids)
+    if workers <= 1:
+        docs, ids = load_txt_corpus(dir_path)
+        r.add(docs, ids)
+        return r
+    for chunk in iter_encoded_txt_chunks(dir_path, workers=workers):
+        r.add_encoded(*chunk)
     return r
 
+def build_bm25_from_pairs(pairs: Iterable[Tuple[str, str]], chunk_size: int = 1000) -> BM25Retriever:
+    """Index a stream of (id, text), e.g. from corpus.iter_pubmed_xml / iter_csv_corpus."""
+    r = BM25Retriever()
+    for chunk in iter_encoded_chunks(pairs, chunk_size=chunk_size):
+        r.add_encoded(*chunk)
+    return r
+
+def build_bm25(source: str | Path, workers: int = 1, schema: Schema = None) -> BM25Retriever:
+    """Index a *.txt directory or a single XML/JSONL/CSV corpus file (see corpus.iter_corpus)."""
+    if Path(source).is_dir():
+        return build_bm25_from_dir(source, workers=workers)
+    return build_bm25_from_pairs(iter_corpus(source, schema=schema))
+
+def iter_source_chunks(
+    source: str | Path, workers: int = 1, schema: Schema = None
+) -> Iterator[EncodedChunk]:
+    """Encoded chunks of any corpus source, for build_index_external."""
+    if Path(source).is_dir():
+        return iter_encoded_txt_chunks(source, workers=workers)
+    return iter_encoded_chunks(iter_corpus(source, schema=schema))
+
+def default_index_dir(source: str | Path) -> Path:
+    """DIR/.bm25_index for a *.txt directory, FILE.bm25_index next to a corpus file."""
+    p = Path(source)
+    if p.is_dir():
+        return p / DEFAULT_INDEX_DIRNAME
+    return p.with_name(p.name + DEFAULT_INDEX_DIRNAME)
+
 def topk_ids_scores(r: BM25Retriever, query: str, k: int = 3) -> List[Tuple[str, float]]:
     return r.query(query, k=k)
+
+class PackedTexts:
+    """
+    Read-only view of documents packed into one UTF-8 blob plus offsets,
+    usually memory-mapped. Supports the append/overwrite calls BM25Retriever
+    makes on its document list by keeping changes in memory on top.
+    """
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+        self._blob = blob
+        self._offsets = offsets
+        self._n_packed = len(offsets) - 1
+        self._extra: List[str] = []
+        self._overrides: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._n_packed + len(self._extra)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if i in self._overrides:
+            return self._overrides[i]
+        if i >= self._n_packed:
+            return self._extra[i - self._n_packed]
+        lo, hi = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[lo:hi].tobytes().decode("utf-8")
+
+    def __setitem__(self, i: int, text: str) -> None:
+        if i >= self._n_packed:
+            self._extra[i - self._n_packed] = text
+        else:
+            self._overrides[i] = text
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def extend(self, docs: List[str]) -> None:
+        self._extra.extend(docs)
+
+def source_fingerprint(dir_path: str | Path) -> str:
+    """
+    Hash of (name, size, mtime) of every *.txt in dir_path (or of the corpus
+    file itself); changes when the corpus does.
+    """
+    h = hashlib.sha1()
+    p = Path(dir_path)
+    files = [p] if p.is_file() else sorted(p.glob("*.txt"))
+    for fp in files:
+        st = fp.stat()
+        h.update(f"{fp.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def save_index(r: BM25Retriever, out_dir: str | Path, fingerprint: str | None = None) -> Path:
+    """
+    Write r as a versioned index directory:
+      meta.json, vocab.txt, ids.json, docs.bin and one .npy per array
+      (CSR postings, doc lengths, document frequencies, text offsets).
+    Deleted rows are left out of the saved copy; r itself is not modified. The
+    directory is written aside and swapped in by rename (see _swap_in).
+    """
+    r = r.snapshot()
+    idx = r.index
+    out = Path(out_dir)
+    tmp = _fresh_tmp_dir(out)
+
+    n_terms = len(idx.vocab)
+    if idx.segments:
+        seg = idx.segments[0]
+        indptr, post_rows, tfs = seg.indptr, seg.post_rows, seg.tfs
+    else:
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        post_rows = np.zeros(0, dtype=np.int32)
+        tfs = np.zeros(0, dtype=np.int32)
+    encoded = [d.encode("utf-8") for d in r._docs]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    with (tmp / "docs.bin").open("wb") as f:
+        for e in encoded:
+            f.write(e)
+    arrays = {
+        "indptr": indptr, "post_rows": post_rows, "tfs": tfs,
+        "doc_len": idx.doc_len, "df": idx.df, "doc_offsets": offsets,
+    }
+    for name in _ARRAYS:
+        np.save(tmp / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+    (tmp / "ids.json").write_text(json.dumps(r._doc_ids, ensure_ascii=False), encoding="utf-8")
+    _write_vocab_and_meta(tmp, idx.vocab, idx.n_rows, fingerprint, idx.k1, idx.b, idx.epsilon)
+    return _swap_in(tmp, out)
+
+def _fresh_tmp_dir(out: Path) -> Path:
+    """A staging directory next to out, unique per writer so concurrent rebuilds never share one."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=out.parent, prefix=out.name + ".tmp."))
+
+def _write_vocab_and_meta(
+    tmp: Path, vocab: Dict[str, int], n_docs: int, fingerprint: str | None,
+    k1: float, b: float, epsilon: float,
+) -> None:
+    terms = sorted(vocab, key=vocab.__getitem__)
+    (tmp / "vocab.txt").write_text("\n".join(terms), encoding="utf-8")
+    meta = {
+        "format": INDEX_FORMAT, "version": INDEX_VERSION,
+        "k1": k1, "b": b, "epsilon": epsilon,
+        "n_docs": n_docs, "n_terms": len(vocab), "source_fingerprint": fingerprint,
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+def _swap_in(tmp: Path, out: Path) -> Path:
+    """
+    Move the finished tmp directory to out. An existing index is renamed aside
+    first and deleted only after the new one is in place, so out always holds
+    a complete index, except for the instant between the two renames, and a
+    crash never leaves a half-written one behind. If a concurrent writer
+    swaps its index in between, that one is kept and tmp is discarded.
+    """
+    old = Path(tempfile.mkdtemp(dir=out.parent, prefix=out.name + ".old."))
+    try:
+        try:
+            os.replace(out, old)
+        except FileNotFoundError:
+            pass  # first build, or another writer moved it aside already
+        try:
+            os.replace(tmp, out)
+        except OSError as exc:
+            if exc.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)  # another writer's index landed first
+    finally:
+        shutil.rmtree(old, ignore_errors=True)
+    return out
+
+def build_index_external(
+    chunks: Iterable[EncodedChunk],
+    out_dir: str | Path,
+    memory_mb: float = 512,
+    fingerprint: str | None = None,
+    k1: float = 1.5,
+    b: float = 0.75,
+    epsilon: float = 0.25,
+) -> Path:
+    """
+    Write a save_index-compatible index from a stream of encoded chunks
+    (corpus.iter_encoded_chunks / iter_encoded_txt_chunks) without holding the
+    corpus in memory. Texts and ids are streamed straight to disk; postings are
+    accumulated until ~memory_mb, then spilled as a sorted run. Runs cover
+    increasing row ranges, so the final merge just interleaves them term range
+    by term range into memory-mapped output arrays. Only the vocabulary and
+    per-document lengths/offsets stay resident.
+    """
+    out = Path(out_dir)
+    tmp = _fresh_tmp_dir(out)
+    runs_dir = tmp / "runs"
+    runs_dir.mkdir()
+    budget = max(1, int(memory_mb * (1 << 20)))
+    vocab: Dict[str, int] = {}
+    lens: List[np.ndarray] = []
+    sizes: List[np.ndarray] = []
+    pending: List[Tuple[np.ndarray, np.ndarray]] = []
+    pending_bytes = 0
+    run_start = n_docs = 0
+    runs: List[Path] = []
+
+    def spill() -> None:
+        nonlocal pending, pending_bytes, run_start
+        if not pending:
+            return
+        term_ids = np.concatenate([t for t, _ in pending])
+        doc_len = np.concatenate([d for _, d in pending])
+        local_rows = np.repeat(np.arange(len(doc_len), dtype=np.int64), doc_len)
+        indptr, post_rows, tfs = _build_postings(term_ids, local_rows, len(vocab), len(doc_len))
+        run = runs_dir / f"run{len(runs):05d}"
+        np.save(f"{run}.indptr.npy", indptr)
+        np.save(f"{run}.post_rows.npy", post_rows + np.int32(run_start))
+        np.save(f"{run}.tfs.npy", tfs)
+        runs.append(run)
+        run_start += len(doc_len)
+        pending, pending_bytes = [], 0
+
+    with (tmp / "docs.bin").open("wb") as blob, (tmp / "ids.json").open("w", encoding="utf-8") as ids_f:
+        ids_f.write("[")
+        for docs, ids, terms, term_ids, doc_len in chunks:
+            lut = np.asarray([vocab.setdefault(t, len(vocab)) for t in terms], dtype=np.int64)
+            encoded = [d.encode("utf-8") for d in docs]
+            blob.write(b"".join(encoded))
+            sizes.append(np.asarray([len(e) for e in encoded], dtype=np.int64))
+            for i in ids:
+                ids_f.write(("," if n_docs else "") + json.dumps(i, ensure_ascii=False))
+                n_docs += 1
+            doc_len = np.asarray(doc_len, dtype=np.int32)
+            lens.append(doc_len)
+            pending.append((lut[term_ids], doc_len))
+            # int64 key + unique/sort scratch: roughly 32 bytes per token while building a run
+            pending_bytes += 32 * len(term_ids)
+            if pending_bytes >= budget:
+                spill()
+        spill()
+        ids_f.write("]")
+
+    n_terms = len(vocab)
+    run_arrays = []
+    for run in runs:
+        ip = np.load(f"{run}.indptr.npy")
+        ip = np.concatenate([ip, np.full(n_terms + 1 - len(ip), ip[-1], dtype=np.int64)])
+        rows = np.load(f"{run}.post_rows.npy", mmap_mode="r")
+        tfs = np.load(f"{run}.tfs.npy", mmap_mode="r")
+        run_arrays.append((ip, rows, tfs))
+    df = sum((np.diff(ip) for ip, _, _ in run_arrays), np.zeros(n_terms, dtype=np.int64))
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+    total = int(indptr[-1])
+    out_rows = np.lib.format.open_memmap(tmp / "post_rows.npy", "w+", np.int32, (total,))
+    out_tfs = np.lib.format.open_memmap(tmp / "tfs.npy", "w+", np.int32, (total,))
+    step = max(1, budget // 32)
+    t0 = 0
+    while t0 < n_terms:
+        # widest term range whose postings fit the budget (at least one term)
+        t1 = int(np.searchsorted(indptr, indptr[t0] + step, side="right")) - 1
+        t1 = min(n_terms, max(t1, t0 + 1))
+        terms_p, rows_p, tfs_p = [], [], []
+        for ip, rows, tfs in run_arrays:
+            lo, hi = ip[t0], ip[t1]
+            terms_p.append(np.repeat(np.arange(t0, t1, dtype=np.int64), np.diff(ip[t0 : t1 + 1])))
+            rows_p.append(rows[lo:hi])
+            tfs_p.append(tfs[lo:hi])
+        if terms_p:
+            order = np.argsort(np.concatenate(terms_p), kind="stable")
+            out_rows[indptr[t0] : indptr[t1]] = np.concatenate(rows_p)[order]
+            out_tfs[indptr[t0] : indptr[t1]] = np.concatenate(tfs_p)[order]
+        t0 = t1
+    out_rows.flush()
+    out_tfs.flush()
+    del out_rows, out_tfs, run_arrays
+    shutil.rmtree(runs_dir)
+
+    offsets = np.zeros(n_docs + 1, dtype=np.int64)
+    if sizes:
+        np.cumsum(np.concatenate(sizes), out=offsets[1:])
+    doc_len = np.concatenate(lens) if lens else np.zeros(0, dtype=np.int32)
+    for name, arr in (("indptr", indptr), ("doc_len", doc_len), ("df", df), ("doc_offsets", offsets)):
+        np.save(tmp / f"{name}.npy", arr)
+    _write_vocab_and_meta(tmp, vocab, n_docs, fingerprint, k1, b, epsilon)
+    return _swap_in(tmp, out)
+
+def read_index_meta(index_dir: str | Path) -> Dict:
+    meta = json.loads((Path(index_dir) / "meta.json").read_text(encoding="utf-8"))
+    if meta.get("format") != INDEX_FORMAT or meta.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported index format in {index_dir}: {meta.get('format')} v{meta.get('version')}")
+    return meta
+
+def load_index(index_dir: str | Path) -> BM25Retriever:
+    """Open an index written by save_index; postings and texts are memory-mapped, not read."""
+    p = Path(index_dir)
+    meta = read_index_meta(p)
+    arr = {name: np.load(p / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+    terms = (p / "vocab.txt").read_text(encoding="utf-8")
+    vocab = {t: i for i, t in enumerate(terms.split("\n"))} if meta["n_terms"] else {}
+    ids = json.loads((p / "ids.json").read_text(encoding="utf-8"))
+    blob_path = p / "docs.bin"
+    blob: np.ndarray
+    if blob_path.stat().st_size:
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+    else:
+        blob = np.zeros(0, dtype=np.uint8)
+    index = InvertedIndex.from_arrays(
+        vocab, arr["indptr"], arr["post_rows"], arr["tfs"], arr["doc_len"], df=arr["df"],
+        k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"],
+    )
+    texts = PackedTexts(blob, arr["doc_offsets"])
+    # PackedTexts is list-like but not a typing.Sequence
+    return BM25Retriever.from_index(index, texts, ids)  # type: ignore[arg-type]
+
+def open_index(
+    data_dir: str | Path, index_dir: str | Path | None = None, workers: int = 1
+) -> BM25Retriever:
+    """
+    Load the persisted index for data_dir (a *.txt directory or corpus file),
+    (re)building it first when missing, from an older format, or when the
+    source changed since it was built.
+    Falls back to an in-memory index if index_dir is not writable.
+    """
+    index_p = Path(index_dir) if index_dir is not None else default_index_dir(data_dir)
+    fingerprint = source_fingerprint(data_dir)
+    try:
+        if read_index_meta(index_p).get("source_fingerprint") == fingerprint:
+            return load_index(index_p)
+    except (OSError, ValueError):
+        pass
+    r = build_bm25(data_dir, workers=workers)
+    try:
+        save_index(r, index_p, fingerprint=fingerprint)
+    except OSError:
+        return r
+    return load_index(index_p)
@@ -1,18 +1,16 @@
 from __future__ import annotations
 from pathlib import Path
 import json
-import re
 import typer
+from .dense import DenseRetriever
+from .hybrid import HybridRetriever
 from .index import build_bm25_from_dir
-from .eval import context_hit_rate, retrieval_precision_at_k, faithfulness_overlap
+from .retriever import BM25Retriever
+from .eval import evaluate_multi_k, retrieve_all
+from .passages import naive_candidates
 
 app = typer.Typer(add_completion=False)
 
-_WORD = re.compile(r"[a-z0-9]+")
-
-def _tokens(text: str) -> set[str]:
-    return set(_WORD.findall(text.lower()))
-
 def load_qa(qa_path: str) -> list[tuple[str, str]]:
     qa_pairs: list[tuple[str, str]] = []
     with open(qa_path, "r", encoding="utf-8") as f:
@@ -23,44 +21,33 @@ def load_qa(qa_path: str) -> list[tuple[str, str]]:
             qa_pairs.append((obj["question"], obj["answer"]))
     return qa_pairs
 
-def naive_candidates(qa_pairs, retriever, k_for_candidate: int = 1) -> list[str]:
-    cands: list[str] = []
-    for q, _ in qa_pairs:
-        results = retriever.query(q, k=k_for_candidate)
-        if not results:
-            cands.append("")
-            continue
-        doc_id, _ = results[0]
-        idx = retriever._doc_ids.index(doc_id)
-        doc_text = retriever._docs[idx]
-        sentences = re.split(r"(?<=[.!?])\s+", doc_text.strip())
-        q_toks = _tokens(q)
-        best_sent, best_score = "", -1.0
-        for s in sentences:
-            s_toks = _tokens(s)
-            score = len(q_toks & s_toks)
-            if score > best_score:
-                best_score, best_sent = score, s
-        cands.append(best_sent)
-    return cands
-
 @app.command()
 def main(
     data_dir: str = typer.Argument(..., help="Folder with *.txt abstracts"),
     qa_path: str = typer.Argument(..., help="JSONL with QA pairs"),
     max_k: int = typer.Option(3, "--max-k", help="Test values of k from 1..max_k"),
     out_path: str = typer.Option("leaderboard.md", "--out", help="Markdown table output"),
+    retriever_name: str = typer.Option(
+        "bm25", "--retriever", help="bm25, dense, or hybrid (BM25 + dense fused)"
+    ),
+    fusion: str = typer.Option("rrf", "--fusion", help="Hybrid fusion: rrf or weighted"),
 ):
     qa_pairs = load_qa(qa_path)
-    retriever = build_bm25_from_dir(data_dir)
-
-    rows = []
-    for k in range(1, max_k + 1):
-        hit = context_hit_rate(qa_pairs, retriever, k=k)
-        prec = retrieval_precision_at_k(qa_pairs, retriever, k=k)
-        cands = naive_candidates(qa_pairs, retriever, k_for_candidate=1)
-        faith = faithfulness_overlap(qa_pairs, cands, retriever, k=k, threshold=0.6)
-        rows.append({"k": k, **hit, **prec, **faith})
+    bm25 = build_bm25_from_dir(data_dir)
+    retriever: BM25Retriever | DenseRetriever | HybridRetriever = bm25
+    if retriever_name in ("dense", "hybrid"):
+        dense = DenseRetriever.from_pairs(bm25.iter_docs())
+        if retriever_name == "dense":
+            retriever = dense
+        else:
+            retriever = HybridRetriever([bm25, dense], fusion=fusion)
+    elif retriever_name != "bm25":
+        raise typer.BadParameter(f"unknown retriever: {retriever_name}")
+
+    # one top-max_k retrieval pass; every k is scored from its prefixes
+    results = retrieve_all((q for q, _ in qa_pairs), retriever, k=max_k)
+    cands = naive_candidates(qa_pairs, retriever, results=results)
+    rows = evaluate_multi_k(qa_pairs, cands, retriever, max_k=max_k, threshold=0.6, results=results)
 
     lines = ["| k | hit_rate | precision@k | faithfulness |", "|---|----------|-------------|--------------|"]
     for row in rows:
@@ -1,17 +1,83 @@
 from __future__ import annotations
 import os
-from typing import Optional
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, List, Tuple
+from .cache import DiskCache
+from .monitor import MONITOR
+
+_SYSTEM = (
+    "You are a careful assistant. Answer ONLY using the provided context. "
+    "If the answer is not present, say 'I cannot find this in the context.'"
+)
+
+# openai exception types worth retrying, matched by name so openai stays optional
+_TRANSIENT_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+def _is_transient(exc: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx; not auth, bad requests or bugs."""
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in _TRANSIENT_ERRORS
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` acquisitions per second, bursts up to `capacity`."""
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
 
 class LLM:
     """
     Minimal adapter: answer(question, context) -> str
-    - If OPENAI_API_KEY is set and 'openai' lib available, call OpenAI.
+    - If OPENAI_API_KEY is set and 'openai' lib available, call OpenAI
+      (or any object with the same chat.completions.create API passed as `client`).
     - Otherwise return a heuristic fallback (first sentence of context).
+    Completions are retried with exponential backoff, optionally rate limited
+    to `requests_per_s`, and cached on disk under `cache_dir` keyed by a hash
+    of model + prompt + max_tokens.
     """
-    def __init__(self, model: str = "gpt-4o-mini") -> None:
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        client: Any = None,
+        cache_dir: str | Path | None = None,
+        requests_per_s: float | None = None,
+        max_retries: int = 3,
+        backoff_s: float = 1.0,
+    ) -> None:
         self.model = model
         self._use_openai = False
-        self._client = None
+        self._client = client
+        self.cache = DiskCache(cache_dir) if cache_dir is not None else None
+        self._bucket = TokenBucket(requests_per_s) if requests_per_s else None
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        if client is not None:
+            self._use_openai = True
+            return
         api_key = os.getenv("OPENAI_API_KEY")
         if api_key:
             try:
@@ -21,25 +87,61 @@ class LLM:
             except Exception:
                 self._use_openai = False
 
+    def _complete(self, user: str, max_tokens: int) -> str:
+        """One chat completion; transient errors are retried with jittered exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                with MONITOR.stage("llm.rate_limit_wait"):
+                    self._bucket.acquire()
+            try:
+                with MONITOR.stage("llm.complete"):
+                    resp = self._client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "system", "content": _SYSTEM},
+                                  {"role": "user", "content": user}],
+                        max_tokens=max_tokens,
+                        temperature=0.0,
+                    )
+                return resp.choices[0].message.content.strip()
+            except Exception as exc:
+                MONITOR.incr("llm.errors")
+                if attempt == self.max_retries or not _is_transient(exc):
+                    raise
+                MONITOR.incr("llm.retries")
+                time.sleep(self.backoff_s * (2 ** attempt) * (0.5 + random.random() / 2))
+        raise AssertionError("unreachable")
+
+    @MONITOR.timed("llm.answer")
     def answer(self, question: str, context: str, max_tokens: int = 128) -> str:
         if self._use_openai and self._client:
-            # Simple, grounded instruction
-            system = (
-                "You are a careful assistant. Answer ONLY using the provided context. "
-                "If the answer is not present, say 'I cannot find this in the context.'"
-            )
             user = f"Context:\n{context}\n\nQuestion: {question}\nAnswer succinctly:"
+            key = DiskCache.key(self.model, _SYSTEM, user, max_tokens)
+            if self.cache is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    MONITOR.incr("llm.cache_hits")
+                    return cached
             try:
-                resp = self._client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "system", "content": system},
-                              {"role": "user", "content": user}],
-                    max_tokens=max_tokens,
-                    temperature=0.0,
-                )
-                return resp.choices[0].message.content.strip()
+                text = self._complete(user, max_tokens)
+                if self.cache is not None:
+                    self.cache.put(key, text)
+                return text
             except Exception:
                 pass
+        MONITOR.incr("llm.fallbacks")
         # Fallback: take first sentence from context or empty
         sentence = context.split(".")[0].strip()
         return sentence if sentence else ""
+
+    def answer_many(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        max_tokens: int = 128,
+        concurrency: int = 8,
+    ) -> List[str]:
+        """answer() for many (question, context) pairs on `concurrency` threads, in order."""
+        pairs = list(pairs)
+        if concurrency <= 1 or len(pairs) <= 1:
+            return [self.answer(q, c, max_tokens) for q, c in pairs]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda qc: self.answer(qc[0], qc[1], max_tokens), pairs))
@@ -1,5 +1,169 @@
 """
-Monitoring stub: logs basic drift stats to CSV (future).
+Pipeline instrumentation: per-stage timers and counters with p50/p95/p99,
+exported as JSON-ready dicts, CSV or Prometheus text, plus an opt-in
+cProfile/tracemalloc capture of a single run.
+
+Stages are dotted names grouped by subsystem ("corpus.load",
+"retriever.score", "llm.complete", "eval.faithfulness", ...). Modules record
+into the process-wide MONITOR; recording is a perf_counter pair and a deque
+append under a lock, and a disabled monitor records nothing.
 """
-def log_drift_stub():
-    print("Logging drift (stub)")
\ No newline at end of file
+from __future__ import annotations
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, TypeVar
+
+import numpy as np
+
+F = TypeVar("F", bound=Callable)
+
+class StageStats:
+    """Count, total and recent latencies (milliseconds) of one stage."""
+    def __init__(self, window: int = 4096) -> None:
+        self.count = 0
+        self.total_s = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total_s += seconds
+        self._recent.append(seconds * 1000.0)
+
+    def summary(self) -> Dict[str, float]:
+        if not self._recent:
+            return {"count": self.count}
+        recent = np.fromiter(self._recent, dtype=float)
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+        return {
+            "count": self.count, "total_ms": self.total_s * 1000.0,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": float(recent.max()),
+        }
+
+class Monitor:
+    """Named stage timers and counters; thread-safe."""
+    def __init__(self, enabled: bool = True, window: int = 4096) -> None:
+        self.enabled = enabled
+        self.window = window
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(self.window)
+            stats.add(seconds)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one call of `name` (also when it raises)."""
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorator form of stage()."""
+        def wrap(fn: F) -> F:
+            @wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - t0)
+            return inner  # type: ignore[return-value]
+        return wrap
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+
+    def summary(self) -> Dict[str, Dict]:
+        """{"stages": {name: {count, total_ms, p50_ms, ...}}, "counters": {name: n}}, sorted by name."""
+        with self._lock:
+            stages = {name: s.summary() for name, s in sorted(self._stages.items())}
+            counters = dict(sorted(self._counters.items()))
+        return {"stages": stages, "counters": counters}
+
+    def to_csv(self) -> str:
+        """One row per stage: stage,count,total_ms,p50_ms,p95_ms,p99_ms,max_ms."""
+        cols = ["count", "total_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        lines = ["stage," + ",".join(cols)]
+        for name, s in self.summary()["stages"].items():
+            lines.append(name + "," + ",".join(f"{s[c]:.6g}" if c in s else "" for c in cols))
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self, prefix: str = "pubmed_rag") -> str:
+        """Prometheus text exposition: a summary per stage (seconds) and a counter per counter."""
+        summary = self.summary()
+        lines: List[str] = []
+        if summary["stages"]:
+            metric = f"{prefix}_stage_seconds"
+            lines += [f"# HELP {metric} Time spent per pipeline stage.", f"# TYPE {metric} summary"]
+            for name, s in summary["stages"].items():
+                for q in ("50", "95", "99"):
+                    if f"p{q}_ms" in s:
+                        lines.append(f'{metric}{{stage="{name}",quantile="0.{q}"}} {s[f"p{q}_ms"] / 1000.0:.9g}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {s.get("total_ms", 0.0) / 1000.0:.9g}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {s["count"]}')
+        if summary["counters"]:
+            metric = f"{prefix}_events_total"
+            lines += [f"# HELP {metric} Pipeline event counts.", f"# TYPE {metric} counter"]
+            for name, n in summary["counters"].items():
+                lines.append(f'{metric}{{event="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+MONITOR = Monitor()
+
+@contextmanager
+def profile_run(out_dir: str | Path, top: int = 40) -> Iterator[Dict[str, str]]:
+    """
+    cProfile and tracemalloc over the enclosed block. Writes profile.pstats,
+    profile.txt (top functions by cumulative time) and memory.txt (peak and
+    top allocation sites) to out_dir; the yielded dict maps each to its path.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    paths = {name: str(out / name) for name in ("profile.pstats", "profile.txt", "memory.txt")}
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield paths
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(paths["profile.pstats"])
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+        Path(paths["profile.txt"]).write_text(text.getvalue(), encoding="utf-8")
+        lines = [f"peak traced memory: {peak / (1 << 20):.1f} MiB", ""]
+        lines += [str(s) for s in snapshot.statistics("lineno")[:top]]
+        Path(paths["memory.txt"]).write_text("\n".join(lines) + "\n", encoding="utf-8")
@@ -0,0 +1,153 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import numpy as np
+from scipy import sparse
+from .eval import retrieve_all
+from .retriever import _tokenize, encode_docs
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+Results = List[List[Tuple[str, float]]]
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) offsets of the sentences re.split(r"(?<=[.!?])\\s+", text.strip()) gives."""
+    lead = len(text) - len(text.lstrip())
+    body = text.strip()
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for m in _SENT_SPLIT.finditer(body):
+        spans.append((lead + start, lead + m.start()))
+        start = m.end()
+    spans.append((lead + start, lead + len(body)))
+    return spans
+
+class SentenceIndex:
+    """
+    Sentence offsets and per-sentence distinct-term sets for a whole corpus,
+    built in one pass. Sentences of document d are rows sent_ptr[d]:sent_ptr[d+1]
+    of the sentences x terms 0/1 matrix `terms`; their text is
+    texts[d][starts[s]:ends[s]].
+    """
+    def __init__(
+        self,
+        ids: List[str],
+        texts: List[str],
+        sent_ptr: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        vocab: Dict[str, int],
+        terms: sparse.csr_matrix,
+    ) -> None:
+        self.ids = ids
+        self.texts = texts
+        self.sent_ptr = sent_ptr
+        self.starts = starts
+        self.ends = ends
+        self.vocab = vocab
+        self.terms = terms
+        self.doc_of = {d: i for i, d in enumerate(ids)}
+        self.sent_doc = np.repeat(np.arange(len(ids)), np.diff(sent_ptr))
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]]) -> SentenceIndex:
+        """Index (id, text) pairs, e.g. BM25Retriever.iter_docs()."""
+        ids: List[str] = []
+        texts: List[str] = []
+        counts: List[int] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        sentences: List[str] = []
+        for doc_id, text in pairs:
+            spans = sentence_spans(text)
+            ids.append(doc_id)
+            texts.append(text)
+            counts.append(len(spans))
+            starts.extend(s for s, _ in spans)
+            ends.extend(e for _, e in spans)
+            sentences.extend(text[s:e] for s, e in spans)
+        terms, term_ids, sent_len = encode_docs(sentences)
+        rows = np.repeat(np.arange(len(sentences), dtype=np.int64), sent_len)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(term_ids), dtype=np.int32), (rows, term_ids)),
+            shape=(len(sentences), len(terms)),
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        sent_ptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=sent_ptr[1:])
+        return cls(
+            ids, texts, sent_ptr,
+            np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64),
+            {t: i for i, t in enumerate(terms)}, matrix,
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def sentence(self, s: int) -> str:
+        return self.texts[self.sent_doc[s]][self.starts[s] : self.ends[s]]
+
+    def sentences_of(self, doc_id: str) -> range:
+        d = self.doc_of[doc_id]
+        return range(int(self.sent_ptr[d]), int(self.sent_ptr[d + 1]))
+
+    def query_overlap(self, query: str, sents: np.ndarray) -> np.ndarray:
+        """Distinct tokens each sentence in `sents` shares with query."""
+        cols = sorted({self.vocab[t] for t in _tokenize(query) if t in self.vocab})
+        if not cols or len(sents) == 0:
+            return np.zeros(len(sents), dtype=np.int64)
+        return np.asarray(self.terms[sents][:, cols].sum(axis=1), dtype=np.int64).ravel()
+
+    def best_sentences(self, queries: List[str], doc_lists: List[List[str]]) -> List[str]:
+        """
+        For each query, the sentence of its docs (in rank order) sharing the most
+        distinct tokens with it; ties go to the earliest. "" when a query has no docs.
+        All (query, sentence) overlaps come from one sparse intersection.
+        """
+        indptr = [0]
+        cols: List[int] = []
+        for q in queries:
+            cols.extend(self.vocab[t] for t in set(_tokenize(q)) if t in self.vocab)
+            indptr.append(len(cols))
+        qmat = sparse.csr_matrix(
+            (np.ones(len(cols), dtype=np.int32), cols, indptr), shape=(len(queries), len(self.vocab))
+        )
+        qi: List[int] = []
+        sents: List[int] = []
+        for i, docs in enumerate(doc_lists):
+            for doc_id in docs:
+                r = self.sentences_of(doc_id)
+                sents.extend(r)
+                qi.extend([i] * len(r))
+        out = [""] * len(queries)
+        if not sents:
+            return out
+        qi_a = np.asarray(qi)
+        sent_a = np.asarray(sents)
+        overlap = np.asarray(self.terms[sent_a].multiply(qmat[qi_a]).sum(axis=1)).ravel()
+        bounds = np.flatnonzero(np.diff(qi_a)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(qi_a)]):
+            best = sent_a[lo + int(np.argmax(overlap[lo:hi]))]
+            out[qi_a[lo]] = self.sentence(int(best))
+        return out
+
+def naive_candidates(
+    qa_pairs,
+    retriever,
+    k_for_candidate: int = 1,
+    results: Optional[Results] = None,
+    index: Optional[SentenceIndex] = None,
+) -> List[str]:
+    """
+    Best-overlapping sentence among the top k_for_candidate documents of each
+    question. `results` reuses a retrieval pass (at least k_for_candidate deep);
+    `index` reuses a SentenceIndex, otherwise one is built for the retrieved docs.
+    """
+    if results is None:
+        results = retrieve_all((q for q, _ in qa_pairs), retriever, k=k_for_candidate)
+    doc_lists = [[doc_id for doc_id, _ in ranked[:k_for_candidate]] for ranked in results]
+    if index is None:
+        needed = list(dict.fromkeys(d for docs in doc_lists for d in docs))
+        index = SentenceIndex.build(zip(needed, retriever.get_docs(needed)))
+    return index.best_sentences([q for q, _ in qa_pairs], doc_lists)
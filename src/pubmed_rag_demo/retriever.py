@@ -1,7 +1,11 @@
 from __future__ import annotations
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Sequence, Tuple
+import math
 import re
-from rank_bm25 import BM25Okapi
+import numpy as np
+from scipy import sparse
+from .cache import LRUCache
+from .monitor import MONITOR
 
 _TOKEN_RE = re.compile(r"[a-z0-9]+")
 
@@ -9,26 +13,691 @@ def _tokenize(text: str) -> List[str]:
     # lowercase and keep only alphanumerics (splits on punctuation)
     return _TOKEN_RE.findall(text.lower())
 
+def _build_postings(
+    term_ids: np.ndarray, rows: np.ndarray, n_terms: int, n_rows: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn parallel (term_id, row) occurrence arrays into CSR postings.
+    Returns (indptr, post_rows, tfs); rows are ascending inside each term.
+    """
+    key = term_ids.astype(np.int64) * max(n_rows, 1) + rows
+    uniq, tfs = np.unique(key, return_counts=True)
+    terms = uniq // max(n_rows, 1)
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+    return indptr, (uniq % max(n_rows, 1)).astype(np.int32), tfs.astype(np.int32)
+
+@MONITOR.timed("retriever.tokenize")
+def encode_docs(texts: Iterable[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Tokenize texts against a local vocabulary. Returns (terms, term_ids, doc_len):
+    terms in first-occurrence order, every token as an int32 index into terms,
+    and the token count of each text. Compact enough to ship between processes.
+    """
+    vocab: Dict[str, int] = {}
+    ids: List[int] = []
+    lens: List[int] = []
+    for text in texts:
+        toks = _tokenize(text)
+        ids.extend(vocab.setdefault(t, len(vocab)) for t in toks)
+        lens.append(len(toks))
+    return list(vocab), np.asarray(ids, dtype=np.int32), np.asarray(lens, dtype=np.int32)
+
+class _Buffer:
+    """Append-only NumPy array with amortized O(1) growth."""
+    def __init__(self, dtype: type, fill: int = 0) -> None:
+        self._data: np.ndarray = np.full(16, fill, dtype=dtype)
+        self._fill = fill
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[: self._n]
+
+    def resize(self, n: int) -> None:
+        if n > len(self._data):
+            grown = np.full(max(n, 2 * len(self._data)), self._fill, dtype=self._data.dtype)
+            grown[: self._n] = self.view
+            self._data = grown
+        self._n = n
+
+    def extend(self, values: np.ndarray) -> None:
+        start = self._n
+        self.resize(start + len(values))
+        self._data[start : self._n] = values
+
+def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k largest scores, best first, ties to the lower position
+    (what a stable descending sort gives). argpartition is O(N); only the
+    k winners are sorted.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        cand = np.concatenate([above, ties])
+    else:
+        cand = np.arange(n)
+    return cand[np.lexsort((cand, -scores[cand]))]
+
+def _kth_largest(values: np.ndarray, k: int) -> float:
+    return float(np.partition(values, len(values) - k)[len(values) - k])
+
+class _Segment:
+    """Immutable CSR postings for a contiguous block of rows (terms beyond indptr have none)."""
+    __slots__ = ("indptr", "post_rows", "tfs")
+
+    def __init__(self, indptr: np.ndarray, post_rows: np.ndarray, tfs: np.ndarray) -> None:
+        self.indptr = indptr
+        self.post_rows = post_rows
+        self.tfs = tfs
+
+    def lookup(self, tid: int, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """For sorted `rows`, return (mask of rows present in tid's postings, their tfs)."""
+        if tid >= self.n_terms:
+            return np.zeros(len(rows), dtype=np.bool_), np.zeros(0, dtype=np.int32)
+        lo, hi = int(self.indptr[tid]), int(self.indptr[tid + 1])
+        plist = self.post_rows[lo:hi]
+        pos = np.searchsorted(plist, rows)
+        found = pos < len(plist)
+        found[found] = plist[pos[found]] == rows[found]
+        return found, self.tfs[lo:hi][pos[found]]
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.indptr) - 1
+
+    def term_of_postings(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_terms, dtype=np.int64), np.diff(self.indptr))
+
+def _merge_segments(segs: List[_Segment], n_terms: int, live: np.ndarray) -> _Segment:
+    """Concatenate segments in row order, dropping postings of deleted rows."""
+    terms = np.concatenate([s.term_of_postings() for s in segs])
+    rows = np.concatenate([s.post_rows for s in segs])
+    tfs = np.concatenate([s.tfs for s in segs])
+    keep = live[rows]
+    terms, rows, tfs = terms[keep], rows[keep], tfs[keep]
+    # segments cover increasing row ranges, so a stable sort keeps rows ascending
+    order = np.argsort(terms, kind="stable")
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+    return _Segment(indptr, rows[order], tfs[order])
+
+def bm25_idf(df: np.ndarray, n: int, epsilon: float) -> np.ndarray:
+    """
+    BM25Okapi idf for document frequencies `df` over n documents. Negative idfs
+    are floored to epsilon * mean idf; terms with df == 0 get 0.
+    """
+    present = df > 0
+    uniq, inverse = np.unique(df, return_inverse=True)
+    table = np.array([math.log(n - f + 0.5) - math.log(f + 0.5) for f in uniq.tolist()])
+    idf = table[inverse]
+    if present.any():
+        # sequential sum (not pairwise) to reproduce BM25Okapi's running total
+        average_idf = float(np.cumsum(idf[present])[-1]) / int(present.sum())
+        idf[idf < 0] = epsilon * average_idf
+    idf[~present] = 0.0
+    return idf
+
+class InvertedIndex:
+    """
+    Okapi BM25 over a term -> postings inverted index held in CSR NumPy arrays.
+    Documents are addressed by row (insertion order). Each add() writes a new
+    segment; segments are merged log-structured so ingestion stays linear.
+    Deleted rows are tombstoned and their postings dropped on the next merge.
+    Scores over the live rows are identical to rank_bm25.BM25Okapi built on them.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> None:
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.segments: List[_Segment] = []
+        self._df = _Buffer(np.int64)
+        self._doc_len = _Buffer(np.int32)
+        self._live = _Buffer(np.bool_)
+        self.n_live = 0
+        self.total_len = 0
+        self.idf = np.zeros(0)
+        self.norm = np.zeros(0)
+        self.avgdl = 0.0
+        self._bounds: Dict[int, float] = {}
+        self._doc_terms: sparse.csr_matrix | None = None
+        self._global_stats: Tuple[np.ndarray, float] | None = None
+        self._stale = True
+
+    @property
+    def n_rows(self) -> int:
+        return len(self._doc_len)
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        return self._doc_len.view
+
+    @property
+    def live(self) -> np.ndarray:
+        return self._live.view
+
+    @property
+    def df(self) -> np.ndarray:
+        return self._df.view
+
+    @classmethod
+    def from_tokens(cls, tokenized: Iterable[List[str]], **params: float) -> InvertedIndex:
+        idx = cls(**params)
+        idx.add_tokens(tokenized)
+        return idx
+
+    @classmethod
+    def from_arrays(
+        cls,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        post_rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        df: np.ndarray | None = None,
+        **params: float,
+    ) -> InvertedIndex:
+        """Wrap existing single-segment postings (e.g. memory-mapped) with all rows live."""
+        idx = cls(**params)
+        idx.vocab = vocab
+        if len(doc_len):
+            idx.segments = [_Segment(indptr, post_rows, tfs)]
+        idx._df.extend(np.diff(indptr) if df is None else df)
+        idx._doc_len.extend(doc_len)
+        idx._live.extend(np.ones(len(doc_len), dtype=np.bool_))
+        idx.n_live = len(doc_len)
+        idx.total_len = int(np.asarray(doc_len).sum(dtype=np.int64))
+        return idx
+
+    def _term_ids(self, toks: List[str]) -> List[int]:
+        vocab = self.vocab
+        return [vocab.setdefault(t, len(vocab)) for t in toks]
+
+    def add_tokens(self, tokenized: Iterable[List[str]]) -> range:
+        """Index tokenized documents as new rows; returns the rows assigned."""
+        term_ids: List[int] = []
+        lens: List[int] = []
+        for toks in tokenized:
+            term_ids.extend(self._term_ids(toks))
+            lens.append(len(toks))
+        return self.add_encoded(
+            np.asarray(term_ids, dtype=np.int64), np.asarray(lens, dtype=np.int32)
+        )
+
+    def encode_terms(self, terms: List[str]) -> np.ndarray:
+        """Global ids for a chunk-local vocabulary (new terms are appended in order)."""
+        return np.asarray(self._term_ids(terms), dtype=np.int64)
+
+    def add_encoded(self, term_ids: np.ndarray, doc_len: np.ndarray) -> range:
+        """Index documents given as concatenated global term ids and per-doc lengths."""
+        start = self.n_rows
+        if not len(doc_len):
+            return range(start, start)
+        doc_len = np.asarray(doc_len, dtype=np.int32)
+        n = len(doc_len)
+        local_rows = np.repeat(np.arange(n, dtype=np.int64), doc_len)
+        n_terms = len(self.vocab)
+        indptr, post_rows, tfs = _build_postings(
+            np.asarray(term_ids, dtype=np.int64), local_rows, n_terms, n
+        )
+        seg = _Segment(indptr, post_rows + np.int32(start), tfs)
+        self._df.resize(n_terms)
+        self._df.view[:] += np.diff(indptr)
+        self._doc_len.extend(doc_len)
+        self._live.extend(np.ones(n, dtype=np.bool_))
+        self.n_live += n
+        self.total_len += int(doc_len.sum())
+        self.segments.append(seg)
+        # log-structured merge: fold the tail while it is at least half its neighbour
+        while len(self.segments) > 1 and len(self.segments[-2].tfs) <= 2 * len(self.segments[-1].tfs):
+            tail = self.segments[-2:]
+            self.segments[-2:] = [_merge_segments(tail, n_terms, self.live)]
+        self._stale = True
+        return range(start, self.n_rows)
+
+    def remove(self, rows: List[int], tokenized: Iterable[List[str]]) -> None:
+        """Tombstone live rows; `tokenized` are their tokens, used to update df."""
+        for row, toks in zip(rows, tokenized):
+            if not self.live[row]:
+                continue
+            self._live.view[row] = False
+            tids = np.unique(np.asarray([self.vocab[t] for t in toks], dtype=np.int64))
+            self._df.view[tids] -= 1
+            self.n_live -= 1
+            self.total_len -= int(self.doc_len[row])
+        self._stale = True
+
+    def merge(self) -> None:
+        """Fold all segments into one, dropping postings of deleted rows."""
+        if self.segments:
+            self.segments = [_merge_segments(self.segments, len(self.vocab), self.live)]
+
+    def set_global_stats(self, idf: np.ndarray, avgdl: float) -> None:
+        """
+        Score with corpus-wide idf (indexed by this index's term ids) and avgdl
+        instead of its own, e.g. when it holds one shard of a larger corpus.
+        """
+        self._global_stats = (np.asarray(idf, dtype=np.float64), float(avgdl))
+        self._stale = True
+
+    def _refresh(self) -> None:
+        # idf / avgdl / length norms, computed exactly as BM25Okapi does, on demand
+        if not self._stale:
+            return
+        self._stale = False
+        self._bounds = {}
+        self._doc_terms = None
+        if self._global_stats is not None:
+            self.idf, self.avgdl = self._global_stats
+        else:
+            n = self.n_live
+            if n == 0:
+                # everything deleted: tombstoned postings remain, so keep idf/norm sized to them
+                self.avgdl = 0.0
+                self.idf = np.zeros(len(self.vocab))
+            else:
+                self.avgdl = self.total_len / n
+                self.idf = bm25_idf(self.df, n, self.epsilon)
+        avgdl = self.avgdl if self.avgdl > 0 else 1.0
+        self.norm = self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)
+
+    def score(self, tokens: List[str]) -> np.ndarray:
+        """
+        Scatter-add the BM25 contribution of each query token's postings.
+        Repeated query tokens count once per occurrence, as in BM25Okapi.
+        Returns one score per row; deleted rows score -inf.
+        """
+        self._refresh()
+        scores = np.zeros(self.n_rows)
+        for t in tokens:
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            for seg in self.segments:
+                if tid >= seg.n_terms:
+                    continue
+                lo, hi = seg.indptr[tid], seg.indptr[tid + 1]
+                rows = seg.post_rows[lo:hi]
+                tf = seg.tfs[lo:hi]
+                scores[rows] += self.idf[tid] * (tf * (self.k1 + 1) / (tf + self.norm[rows]))
+        if self.n_live < self.n_rows:
+            scores[~self.live] = -np.inf
+        return scores
+
+    def _score_rows(self, tokens: List[str], rows: np.ndarray) -> np.ndarray:
+        """Exact scores of the given sorted rows, accumulated in the same order as score()."""
+        scores = np.zeros(len(rows))
+        for t in tokens:
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            for seg in self.segments:
+                found, tf = seg.lookup(tid, rows)
+                hit = rows[found]
+                scores[found] += self.idf[tid] * (tf * (self.k1 + 1) / (tf + self.norm[hit]))
+        return scores
+
+    def _term_bound(self, tid: int) -> float:
+        """Largest tf*(k1+1)/(tf+norm) over tid's postings; cached until the index changes."""
+        bound = self._bounds.get(tid)
+        if bound is None:
+            bound = 0.0
+            for seg in self.segments:
+                if tid >= seg.n_terms or seg.indptr[tid] == seg.indptr[tid + 1]:
+                    continue
+                lo, hi = seg.indptr[tid], seg.indptr[tid + 1]
+                tf = seg.tfs[lo:hi]
+                sat = tf * (self.k1 + 1) / (tf + self.norm[seg.post_rows[lo:hi]])
+                bound = max(bound, float(sat.max()))
+            self._bounds[tid] = bound
+        return bound
+
+    def _maxscore_candidates(self, tokens: List[str], k: int) -> np.ndarray | None:
+        """
+        MaxScore dynamic pruning. Terms are visited by decreasing score upper bound;
+        once the bounds of the unvisited terms cannot lift an unseen document to the
+        current k-th score, the remaining (usually very common) terms are only probed
+        for surviving candidates instead of scanning their postings. Returns sorted
+        candidate rows that contain the exact top-k, or None if pruning does not apply.
+        """
+        counts: Dict[int, int] = {}
+        for tok in tokens:
+            tid = self.vocab.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        if not counts or any(self.idf[t] < 0 for t in counts):
+            return None  # negative contributions make the bounds invalid
+        k1 = self.k1
+        ubs = {t: m * self.idf[t] * self._term_bound(t) for t, m in counts.items()}
+        order = sorted(counts, key=lambda t: -ubs[t])
+        rest = np.cumsum([ubs[t] for t in order][::-1])[::-1].tolist() + [0.0]
+        acc = np.zeros(self.n_rows)
+        live = self.live if self.n_live < self.n_rows else None
+
+        def add_term(t: int, rows: np.ndarray | None, vals: np.ndarray | None) -> np.ndarray:
+            # rows=None: full scan into acc, returning the rows touched; else probe `rows`
+            w = counts[t] * self.idf[t]
+            touched = []
+            for seg in self.segments:
+                if rows is None:
+                    if t >= seg.n_terms:
+                        continue
+                    lo, hi = seg.indptr[t], seg.indptr[t + 1]
+                    r, tf = seg.post_rows[lo:hi], seg.tfs[lo:hi]
+                    acc[r] += w * (tf * (k1 + 1) / (tf + self.norm[r]))
+                    touched.append(r)
+                elif vals is not None:
+                    found, tf = seg.lookup(t, rows)
+                    vals[found] += w * (tf * (k1 + 1) / (tf + self.norm[rows[found]]))
+            return np.concatenate(touched) if touched else np.zeros(0, dtype=np.int32)
+
+        seen = np.zeros(self.n_rows, dtype=np.bool_)
+        for i, t in enumerate(order):
+            seen[add_term(t, None, None)] = True
+            if live is not None:
+                seen &= live
+            cand = np.flatnonzero(seen)
+            cand = cand[acc[cand] > 0]
+            if len(cand) < k or i + 1 == len(order):
+                continue
+            theta = _kth_largest(acc[cand], k)
+            slack = 1e-9 * max(1.0, abs(theta))
+            if rest[i + 1] >= theta - slack:
+                continue
+            # unseen documents can no longer reach the top-k: probe the rest for candidates
+            vals = acc[cand]
+            for j in range(i + 1, len(order)):
+                keep = vals + rest[j] >= theta - slack
+                cand, vals = cand[keep], vals[keep]
+                add_term(order[j], cand, vals)
+                theta = _kth_largest(vals, k)
+            return cand[vals >= theta - 1e-9 * max(1.0, abs(theta))]
+        return None
+
+    def top_k(self, tokens: List[str], k: int, prune: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k live rows and their scores. Exhaustive scoring uses argpartition;
+        prune=True tries MaxScore first. Both give the same ranking, ties going to
+        the lower row.
+        """
+        self._refresh()
+        k = max(0, min(k, self.n_live))
+        with MONITOR.stage("retriever.score"):
+            cand = self._maxscore_candidates(tokens, k) if prune and k else None
+            scores = self.score(tokens) if cand is None else self._score_rows(tokens, cand)
+        with MONITOR.stage("retriever.topk"):
+            best = _topk(scores, k)
+        rows = best if cand is None else cand[best]
+        return rows, scores[best]
+
+    def doc_term_matrix(self) -> sparse.csr_matrix:
+        """
+        Rows x terms 0/1 CSR matrix: the distinct terms of each live row. The
+        postings already are its CSC form, so this is one transpose, cached
+        until the index changes.
+        """
+        self._refresh()
+        if self._doc_terms is None:
+            n_terms = len(self.vocab)
+            if self.segments:
+                seg = _merge_segments(self.segments, n_terms, self.live)
+                ones = np.ones(len(seg.post_rows), dtype=np.int32)
+                self._doc_terms = sparse.csc_matrix(
+                    (ones, seg.post_rows, seg.indptr), shape=(self.n_rows, n_terms)
+                ).tocsr()
+            else:
+                self._doc_terms = sparse.csr_matrix((self.n_rows, n_terms), dtype=np.int32)
+        return self._doc_terms
+
 class BM25Retriever:
-    def __init__(self) -> None:
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> None:
+        # rows are append-only; deleted rows keep a None id until compact()
         self._docs: List[str] = []
-        self._doc_ids: List[str] = []
-        self._bm25: BM25Okapi | None = None
+        self._doc_ids: List[str | None] = []
+        self._row_of: Dict[str, int] = {}
+        self._lower: Dict[int, str] = {}  # row -> lowercased text, filled on first use
+        self._index = InvertedIndex(k1=k1, b=b, epsilon=epsilon)
+        self._version = 0
+        self._cache: LRUCache | None = None
+
+    def __len__(self) -> int:
+        return self._index.n_live
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._row_of
 
     def add(self, docs: List[str], ids: List[str] | None = None) -> None:
+        """Index new documents; only their own tokens are processed."""
         if ids is None:
             ids = [str(i) for i in range(len(self._docs), len(self._docs) + len(docs))]
         if len(ids) != len(docs):
             raise ValueError("ids and docs must have same length")
+        self.add_encoded(docs, ids, *encode_docs(docs))
+
+    def add_encoded(
+        self,
+        docs: List[str],
+        ids: List[str],
+        terms: List[str],
+        term_ids: np.ndarray,
+        doc_len: np.ndarray,
+    ) -> None:
+        """add() for documents already tokenized by encode_docs (e.g. in a worker process)."""
+        if not (len(ids) == len(docs) == len(doc_len)):
+            raise ValueError("ids, docs and doc_len must have same length")
+        if len(set(ids)) != len(ids) or any(i in self._row_of for i in ids):
+            raise ValueError("doc ids must be unique; use update() to replace a document")
+        with MONITOR.stage("retriever.index"):
+            lut = self._index.encode_terms(terms)
+            rows = self._index.add_encoded(lut[term_ids], doc_len)
         self._docs.extend(docs)
         self._doc_ids.extend(ids)
-        tokenized = [_tokenize(d) for d in self._docs]
-        self._bm25 = BM25Okapi(tokenized)
-
-    def query(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
-        if self._bm25 is None:
-            return []
-        scores = self._bm25.get_scores(_tokenize(text))
-        ranked_idx = sorted(range(len(scores)), key=lambda i: float(scores[i]), reverse=True)[:k]
+        self._row_of.update(zip(ids, rows))
+        self._changed()
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove documents by id (KeyError if an id is unknown); repeated ids count once."""
+        ids = list(dict.fromkeys(ids))
+        missing = [i for i in ids if i not in self._row_of]
+        if missing:
+            raise KeyError(f"unknown doc ids: {missing[:5]}")
+        rows = [self._row_of.pop(i) for i in ids]
+        self._index.remove(rows, (_tokenize(self._docs[r]) for r in rows))
+        for r in rows:
+            self._docs[r] = ""
+            self._doc_ids[r] = None
+            self._lower.pop(r, None)
+        self._changed()
+
+    def update(self, docs: List[str], ids: List[str]) -> None:
+        """Replace documents by id; ids not yet indexed are added."""
+        if len(ids) != len(docs):
+            raise ValueError("ids and docs must have same length")
+        if len(set(ids)) != len(ids):
+            raise ValueError("doc ids must be unique")
+        self.delete([i for i in ids if i in self._row_of])
+        self.add(docs, ids)
+
+    def compact(self) -> None:
+        """Drop deleted rows for good and renumber the survivors (order is kept)."""
+        idx = self._index
+        idx.merge()
+        if idx.n_live == idx.n_rows:
+            return
+        live = idx.live.copy()
+        keep = np.flatnonzero(live).tolist()
+        seg = idx.segments[0]
+        new_row = (np.cumsum(live) - 1).astype(np.int32)
+        self._index = InvertedIndex.from_arrays(
+            idx.vocab, seg.indptr, new_row[seg.post_rows], seg.tfs, idx.doc_len[live],
+            df=idx.df, k1=idx.k1, b=idx.b, epsilon=idx.epsilon,
+        )
+        self._docs = [self._docs[r] for r in keep]
+        self._doc_ids = [self._doc_ids[r] for r in keep]
+        self._row_of = {i: r for r, i in enumerate(self._doc_ids) if i is not None}
+        self._lower = {}
+        self._changed()
+
+    def snapshot(self) -> BM25Retriever:
+        """
+        Independent copy of the live documents, renumbered as compact() would;
+        this retriever (rows, version, cache) is left untouched.
+        """
+        idx = self._index
+        n_terms = len(idx.vocab)
+        live = idx.live.copy()
+        if idx.segments:
+            seg = _merge_segments(idx.segments, n_terms, live)
+            indptr, post_rows, tfs = seg.indptr, seg.post_rows, seg.tfs
+        else:
+            indptr = np.zeros(n_terms + 1, dtype=np.int64)
+            post_rows, tfs = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        new_row = (np.cumsum(live) - 1).astype(np.int32)
+        index = InvertedIndex.from_arrays(
+            dict(idx.vocab), indptr, new_row[post_rows], tfs, idx.doc_len[live],
+            df=idx.df, k1=idx.k1, b=idx.b, epsilon=idx.epsilon,
+        )
+        if idx._global_stats is not None:
+            index.set_global_stats(*idx._global_stats)
+        keep = np.flatnonzero(live).tolist()
+        return BM25Retriever.from_index(
+            index, [self._docs[r] for r in keep], [self.id_at(r) for r in keep]
+        )
+
+    @classmethod
+    def from_index(
+        cls, index: InvertedIndex, docs: Sequence[str], ids: List[str]
+    ) -> BM25Retriever:
+        """Wrap a prebuilt index whose rows are `docs`/`ids` (all live)."""
+        if not (index.n_rows == len(docs) == len(ids)):
+            raise ValueError("index rows, docs and ids must have same length")
+        r = cls(k1=index.k1, b=index.b, epsilon=index.epsilon)
+        r._index = index
+        r._docs = docs  # type: ignore[assignment]
+        r._doc_ids = list(ids)
+        r._row_of = {i: row for row, i in enumerate(ids)}
+        return r
+
+    @property
+    def index(self) -> InvertedIndex:
+        return self._index
+
+    @property
+    def version(self) -> int:
+        """Bumped on every add/delete/update/compact; part of every cache key."""
+        return self._version
+
+    def _changed(self) -> None:
+        self._version += 1
+        if self._cache is not None:
+            self._cache.clear()
+
+    def enable_cache(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        """
+        Cache top-k results keyed by (query tokens, k, index version), LRU-bounded
+        to maxsize entries, each expiring after ttl seconds if given. maxsize=0
+        turns caching off. Cached arrays are read-only.
+        """
+        self._cache = LRUCache(maxsize, ttl) if maxsize > 0 else None
+
+    def cache_stats(self) -> Dict[str, float] | None:
+        return self._cache.stats() if self._cache is not None else None
+
+    def doc_terms(self) -> Tuple[sparse.csr_matrix, Dict[str, int]]:
+        """(rows x terms 0/1 matrix of each document's distinct tokens, vocab); see InvertedIndex.doc_term_matrix."""
+        return self._index.doc_term_matrix(), self._index.vocab
+
+    def get_scores(self, text: str) -> np.ndarray:
+        """BM25 score of every live document for `text`, in insertion order."""
+        scores = self._index.score(_tokenize(text))
+        return scores[self._index.live]
+
+    def get_doc(self, doc_id: str) -> str:
+        """Text of a document by id (KeyError if unknown)."""
+        return self._docs[self._row_of[doc_id]]
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        return [self._docs[self._row_of[i]] for i in ids]
+
+    def iter_docs(self) -> Iterable[Tuple[str, str]]:
+        """(id, text) of every live document, in row order."""
+        for doc_id, text in zip(self._doc_ids, self._docs):
+            if doc_id is not None:
+                yield doc_id, text
+
+    def get_docs_lower(self, ids: Iterable[str]) -> List[str]:
+        """Lowercased texts, each document lowercased once and kept for later calls."""
+        out = []
+        for i in ids:
+            row = self._row_of[i]
+            text = self._lower.get(row)
+            if text is None:
+                text = self._lower[row] = self._docs[row].lower()
+            out.append(text)
+        return out
+
+    def row_of(self, doc_id: str) -> int:
+        """Internal row of a document id; stable until compact()."""
+        return self._row_of[doc_id]
+
+    def doc_at(self, row: int) -> str:
+        return self._docs[row]
+
+    def id_at(self, row: int) -> str:
+        return self._doc_ids[row]  # type: ignore[return-value]
+
+    def query_rows(
+        self, text: str, k: int = 3, prune: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k as parallel arrays (rows, scores), best first; see InvertedIndex.top_k."""
+        toks = _tokenize(text)
+        MONITOR.incr("retriever.queries")
+        if self._cache is None:
+            return self._index.top_k(toks, k, prune=prune)
+        # pruned and exhaustive top-k agree, so prune is not part of the key
+        key = (tuple(toks), k, self._version)
+        hit = self._cache.get(key)
+        MONITOR.incr("retriever.cache_hits" if hit is not None else "retriever.cache_misses")
+        if hit is None:
+            hit = self._index.top_k(toks, k, prune=prune)
+            for a in hit:
+                a.setflags(write=False)
+            self._cache.put(key, hit)
+        return hit
+
+    def query_batch(self, queries: List[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k for many queries as (rows, scores) arrays shaped (len(queries), k');
+        map rows with id_at(). Each query takes the MaxScore-pruned query_rows()
+        path, which returns the exhaustive results and shares its cache.
+        """
+        width = max(0, min(k, self._index.n_live))
+        out_rows = np.zeros((len(queries), width), dtype=np.int64)
+        out_scores = np.zeros((len(queries), width))
+        for i, q in enumerate(queries):
+            out_rows[i], out_scores[i] = self.query_rows(q, k, prune=True)
+        return out_rows, out_scores
+
+    def query(self, text: str, k: int = 3, prune: bool = False) -> List[Tuple[str, float]]:
+        rows, scores = self.query_rows(text, k=k, prune=prune)
         # return top-k even if scores are 0.0 (caller can decide how to use)
-        return [(self._doc_ids[i], float(scores[i])) for i in ranked_idx]
+        return [(self._doc_ids[i], s) for i, s in zip(rows.tolist(), scores.tolist())]
+
+    def query_docs(
+        self, text: str, k: int = 3, prune: bool = False
+    ) -> List[Tuple[str, str, float]]:
+        """Like query() but with the document text: [(doc_id, text, score), ...]."""
+        rows, scores = self.query_rows(text, k=k, prune=prune)
+        return [
+            (self._doc_ids[i], self._docs[i], s) for i, s in zip(rows.tolist(), scores.tolist())
+        ]
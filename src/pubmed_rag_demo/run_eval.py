@@ -1,52 +1,73 @@
 from __future__ import annotations
 import json
-import re
+import weakref
+from contextlib import ExitStack
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional
 import typer
 from .index import build_bm25_from_dir
-from .eval import context_hit_rate, retrieval_precision_at_k, faithfulness_overlap
+from .dense import DenseRetriever
+from .context import ContextAssembler
+from .eval import (
+    ann_recall_latency,
+    answer_containment,
+    context_hit_rate,
+    faithfulness_overlap,
+    pruning_tradeoff,
+    retrieval_precision_at_k,
+    retrieve_all,
+)
 from .llm import LLM
+from .monitor import MONITOR, profile_run
+from .passages import naive_candidates
 
 app = typer.Typer(add_completion=False)
-_WORD = re.compile(r"[a-z0-9]+")
-
-def _tokens(text: str) -> set[str]:
-    return set(_WORD.findall(text.lower()))
-
-def naive_candidates(qa_pairs, retriever, k_for_candidate: int = 1) -> list[str]:
-    candidates: list[str] = []
-    for q, _ in qa_pairs:
-        results = retriever.query(q, k=k_for_candidate)
-        if not results:
-            candidates.append("")
-            continue
-        doc_id, _ = results[0]
-        idx = retriever._doc_ids.index(doc_id)
-        doc_text = retriever._docs[idx]
-        sentences = re.split(r"(?<=[.!?])\s+", doc_text.strip())
-        q_toks = _tokens(q)
-        best_sent, best_score = "", -1.0
-        for s in sentences:
-            s_toks = _tokens(s)
-            score = len(q_toks & s_toks)
-            if score > best_score:
-                best_score, best_sent = score, s
-        candidates.append(best_sent)
-    return candidates
-
-def llm_candidates(qa_pairs, retriever, model_name: str = "gpt-4o-mini") -> list[str]:
-    llm = LLM(model=model_name)
-    cands: list[str] = []
-    for q, _ in qa_pairs:
-        results = retriever.query(q, k=1)
-        if not results:
-            cands.append("")
-            continue
-        doc_id, _ = results[0]
-        idx = retriever._doc_ids.index(doc_id)
-        context = retriever._docs[idx]
-        cands.append(llm.answer(q, context))
+
+# one ContextAssembler per retriever, so its context cache outlives a single llm_candidates call
+_ASSEMBLERS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+def context_assembler(retriever, max_tokens: int) -> ContextAssembler:
+    """The shared ContextAssembler for retriever and budget (a fresh one if retriever can't be weakly referenced)."""
+    try:
+        asm = _ASSEMBLERS.get(retriever)
+    except TypeError:
+        return ContextAssembler(retriever, max_tokens=max_tokens)
+    if asm is None or asm.max_tokens != max_tokens:
+        asm = _ASSEMBLERS[retriever] = ContextAssembler(retriever, max_tokens=max_tokens)
+    return asm
+
+def llm_candidates(
+    qa_pairs,
+    retriever,
+    model_name: str = "gpt-4o-mini",
+    results=None,
+    llm: LLM | None = None,
+    concurrency: int = 8,
+    context_tokens: int | None = None,
+    assembler: ContextAssembler | None = None,
+) -> list[str]:
+    """
+    LLM answer per question. By default the context is the whole top-1 document;
+    with context_tokens (or an explicit assembler) it is assembled from all
+    retrieved documents, and `results` defaults to a top-3 retrieval.
+    """
+    if assembler is None and context_tokens:
+        assembler = context_assembler(retriever, context_tokens)
+    if results is None:
+        results = retrieve_all((q for q, _ in qa_pairs), retriever, k=3 if assembler is not None else 1)
+    llm = llm or LLM(model=model_name)
+    todo = [(i, q, ranked) for i, ((q, _), ranked) in enumerate(zip(qa_pairs, results)) if ranked]
+    if assembler is not None:
+        contexts = assembler.assemble_many(
+            [q for _, q, _ in todo], [ranked for _, _, ranked in todo]
+        )
+    else:
+        contexts = [retriever.get_doc(ranked[0][0]) for _, _, ranked in todo]
+    answers = llm.answer_many([(q, ctx) for (_, q, _), ctx in zip(todo, contexts)], concurrency=concurrency)
+    cands = [""] * len(qa_pairs)
+    for (i, _, _), ans in zip(todo, answers):
+        cands[i] = ans
     return cands
 
 @app.command()
@@ -57,43 +78,93 @@ def main(
     out_dir: str = typer.Option("outputs", "--out-dir", help="Where to save metrics/report"),
     use_llm: bool = typer.Option(False, "--use-llm/--no-llm", help="Use LLM for candidates"),
     llm_model: str = typer.Option("gpt-4o-mini", "--llm-model", help="LLM model name"),
+    llm_concurrency: int = typer.Option(8, "--llm-concurrency", help="Parallel LLM requests"),
+    llm_rps: Optional[float] = typer.Option(None, "--llm-rps", help="Max LLM requests per second"),
+    llm_cache_dir: Optional[str] = typer.Option(
+        None, "--llm-cache-dir", help="On-disk LLM response cache (default: OUT_DIR/llm_cache)"
+    ),
+    context_tokens: int = typer.Option(
+        512, "--context-tokens", help="LLM context budget assembled from the top-k docs (0: whole top-1 doc)"
+    ),
+    candidate_docs: int = typer.Option(
+        1, "--candidate-docs", help="Pick the naive candidate sentence from this many top docs"
+    ),
     dump_candidates: bool = typer.Option(False, "--dump-candidates/--no-dump-candidates", help="Write per-QA JSONL"),
+    ann_nprobe: Optional[str] = typer.Option(
+        None, "--ann-nprobe", help="Comma-separated nprobe values: report dense IVF recall vs latency"
+    ),
+    prune_budgets: Optional[str] = typer.Option(
+        None, "--prune-budgets", help="Comma-separated postings budgets in (0, 1]: report BM25 pruning loss vs speedup"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile/--no-profile", help="Capture cProfile + tracemalloc output under OUT_DIR/profile_<ts>"
+    ),
 ):
     data_p = Path(data_dir)
     qa_p = Path(qa_path)
     out_p = Path(out_dir)
     out_p.mkdir(parents=True, exist_ok=True)
-    typer.echo(f"DEBUG out_dir={out_p.resolve()} dump_candidates={dump_candidates}")
-
-    # load QA
-    qa_pairs = []
-    with qa_p.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            obj = json.loads(line)
-            qa_pairs.append((obj["question"], obj["answer"]))
-
-    retriever = build_bm25_from_dir(data_p)
-
-    # retrieval metrics
-    hit = context_hit_rate(qa_pairs, retriever, k=k)
-    prec = retrieval_precision_at_k(qa_pairs, retriever, k=k)
-
-    # candidates
-    if use_llm:
-        cands = llm_candidates(qa_pairs, retriever, model_name=llm_model)
-    else:
-        cands = naive_candidates(qa_pairs, retriever, k_for_candidate=1)
-
-    # faithfulness
-    faith = faithfulness_overlap(qa_pairs, cands, retriever, k=k, threshold=0.6)
-
-    # collate + save aggregate
-    metrics = {"k": k, **hit, **prec, **faith, "used_llm": use_llm}
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    MONITOR.reset()
+
+    with ExitStack() as stack:
+        if profile:
+            prof_paths = stack.enter_context(profile_run(out_p / f"profile_{ts}"))
+        # load QA
+        qa_pairs = []
+        with MONITOR.stage("corpus.qa_load"), qa_p.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                obj = json.loads(line)
+                qa_pairs.append((obj["question"], obj["answer"]))
+
+        with MONITOR.stage("retriever.build"):
+            retriever = build_bm25_from_dir(data_p)
+
+        # retrieval metrics (one batched retrieval pass shared by all metrics)
+        results = retrieve_all((q for q, _ in qa_pairs), retriever, k=max(k, candidate_docs))
+        contains = answer_containment(qa_pairs, retriever, k=k, results=results)
+        hit = context_hit_rate(qa_pairs, retriever, k=k, contains=contains)
+        prec = retrieval_precision_at_k(qa_pairs, retriever, k=k, contains=contains)
+
+        # candidates
+        with MONITOR.stage("eval.candidates"):
+            if use_llm:
+                llm = LLM(
+                    model=llm_model,
+                    cache_dir=llm_cache_dir or out_p / "llm_cache",
+                    requests_per_s=llm_rps,
+                )
+                cands = llm_candidates(
+                    qa_pairs, retriever, results=results, llm=llm,
+                    concurrency=llm_concurrency, context_tokens=context_tokens or None,
+                )
+            else:
+                cands = naive_candidates(qa_pairs, retriever, k_for_candidate=candidate_docs, results=results)
+
+        # faithfulness
+        faith = faithfulness_overlap(qa_pairs, cands, retriever, k=k, threshold=0.6, results=results)
+
+        # collate + save aggregate
+        metrics: Dict[str, Any] = {"k": k, **hit, **prec, **faith, "used_llm": use_llm}
+        if ann_nprobe:
+            with MONITOR.stage("eval.ann"):
+                dense = DenseRetriever.from_pairs(retriever.iter_docs())
+                dense.build_ivf()
+                nprobes = [int(x) for x in ann_nprobe.split(",") if x.strip()]
+                metrics["ann"] = ann_recall_latency((q for q, _ in qa_pairs), dense, k=k, nprobes=nprobes)
+        if prune_budgets:
+            with MONITOR.stage("eval.pruning"):
+                budgets = [float(x) for x in prune_budgets.split(",") if x.strip()]
+                metrics["pruning"] = pruning_tradeoff(qa_pairs, retriever, k=k, budgets=budgets)
+    metrics["timings"] = MONITOR.summary()
+    if profile:
+        metrics["profile"] = prof_paths
     metrics_path = out_p / f"metrics_{ts}.json"
     report_path = out_p / f"report_{ts}.md"
+    (out_p / f"timings_{ts}.csv").write_text(MONITOR.to_csv(), encoding="utf-8")
+    (out_p / f"timings_{ts}.prom").write_text(MONITOR.to_prometheus(), encoding="utf-8")
 
     with metrics_path.open("w", encoding="utf-8") as f:
         json.dump(metrics, f, ensure_ascii=False, indent=2)
@@ -105,6 +176,31 @@ def main(
         f.write(f"- `precision_at_k`: **{metrics['precision_at_k']:.3f}**\n")
         f.write(f"- `faithfulness`: **{metrics['faithfulness']:.3f}**\n")
         f.write(f"- `used_llm`: **{use_llm}**\n")
+        if "ann" in metrics:
+            f.write("\n## Dense IVF recall vs latency\n\n| nprobe | recall@k | ms/query |\n|---|---|---|\n")
+            for row in metrics["ann"]:
+                label = row["nprobe"] or "exact"
+                f.write(f"| {label} | {row['recall_at_k']:.3f} | {row['ms_per_query']:.3f} |\n")
+        if "pruning" in metrics:
+            f.write(
+                "\n## BM25 static pruning: quality loss vs speedup\n\n"
+                "| budget | postings kept | hit_rate (loss) | precision@k (loss) | ms/query | speedup |\n"
+                "|---|---|---|---|---|---|\n"
+            )
+            for row in metrics["pruning"]:
+                label = "exhaustive" if row["budget"] is None else row["budget"]
+                f.write(
+                    f"| {label} | {row['postings_kept']:.3f} "
+                    f"| {row['hit_rate']:.3f} ({row['hit_rate_loss']:+.3f}) "
+                    f"| {row['precision_at_k']:.3f} ({row['precision_loss']:+.3f}) "
+                    f"| {row['ms_per_query']:.3f} | {row['speedup']:.2f}x |\n"
+                )
+        f.write("\n## Time per stage\n\n| stage | calls | total ms | p50 ms | p95 ms | p99 ms |\n|---|---|---|---|---|---|\n")
+        for name, st in metrics["timings"]["stages"].items():
+            f.write(
+                f"| {name} | {st['count']} | {st['total_ms']:.2f} "
+                f"| {st['p50_ms']:.3f} | {st['p95_ms']:.3f} | {st['p99_ms']:.3f} |\n"
+            )
 
     typer.echo(f"Saved metrics: {metrics_path}")
     typer.echo(f"Saved report:  {report_path}")
@@ -114,13 +210,12 @@ def main(
     if dump_candidates:
         dump_path = out_p / f"candidates_{ts}.jsonl"
         with dump_path.open("w", encoding="utf-8") as f:
-            for (q, a_gt), cand in zip(qa_pairs, cands):
-                results = retriever.query(q, k=1)
-                doc_id, _ = results[0] if results else ("", 0.0)
+            # top doc comes from the retrieval pass above; nothing is re-queried
+            for (q, a_gt), cand, ranked in zip(qa_pairs, cands, results):
+                doc_id, _ = ranked[0] if ranked else ("", 0.0)
                 ctx = ""
-                if results:
-                    idx = retriever._doc_ids.index(doc_id)
-                    ctx = retriever._docs[idx]
+                if ranked:
+                    ctx = retriever.get_doc(doc_id)
                 f.write(json.dumps({
                     "question": q,
                     "answer_gt": a_gt,
@@ -0,0 +1,273 @@
+"""
+Long-running HTTP/JSON query server with a warm index.
+
+Endpoints:
+  POST /query        {"q": "...", "k": 3}            -> {"query", "results": [[id, score], ...]}
+  POST /query_batch  {"queries": ["..."], "k": 3}    -> {"results": [[[id, score], ...], ...]}
+  GET  /stats                                         -> counters and per-stage latency
+  GET  /health                                        -> {"status": "ok", "docs": N}
+
+Concurrent /query requests that arrive within batch_window_ms are grouped
+into one query_batch() call on a single worker thread. That way the event
+loop keeps accepting requests and the index is never touched concurrently.
+Grouping saves a thread hop per request. Whether scoring itself is
+vectorized depends on the retriever: DenseRetriever scores the group with
+one matrix product, while BM25Retriever still runs MaxScore-pruned top-k
+once per query.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from .monitor import StageStats
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+def _run_batch(retriever, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+    """Top-k for a group of queries: query_batch() if the retriever has it, else query() each."""
+    if hasattr(retriever, "query_batch"):
+        rows, scores = retriever.query_batch(queries, k=k)
+        return [
+            [(retriever.id_at(r), s) for r, s in zip(rr, ss)]
+            for rr, ss in zip(rows.tolist(), scores.tolist())
+        ]
+    return [retriever.query(q, k=k) for q in queries]
+
+class QueryServer:
+    def __init__(
+        self,
+        retriever,
+        batch_window_ms: float = 2.0,
+        max_batch: int = 64,
+        timeout_s: float = 5.0,
+        max_body_bytes: int = 1 << 20,
+        max_queries: int = 1024,
+        max_k: int = 100,
+    ) -> None:
+        self.retriever = retriever
+        self.batch_window_ms = batch_window_ms
+        self.max_batch = max_batch
+        self.timeout_s = timeout_s
+        self.max_body_bytes = max_body_bytes
+        self.max_queries = max_queries
+        self.max_k = max_k
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self._queue: asyncio.Queue | None = None
+        self._batcher: asyncio.Task | None = None
+        self._latency = {s: StageStats() for s in ("queue", "score", "request")}
+        self._counters = {"requests": 0, "queries": 0, "batches": 0, "errors": 0, "timeouts": 0}
+
+    # -- micro-batching -------------------------------------------------------
+    def _ensure_batcher(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        return self._queue
+
+    async def _batch_loop(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window_ms / 1000.0
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch = [item for item in batch if not item[2].done()]  # drop timed-out callers
+            if not batch:
+                continue
+            now = time.perf_counter()
+            for _, _, _, enqueued in batch:
+                self._latency["queue"].add(now - enqueued)
+            k = max(item[1] for item in batch)
+            try:
+                results = await self._score([item[0] for item in batch], k)
+            except Exception as exc:  # deliver the failure to every waiter
+                for _, _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            for (_, item_k, fut, _), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res[:item_k])  # top-k is a prefix of top-max(k)
+
+    async def _score(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._pool, _run_batch, self.retriever, queries, k)
+        self._latency["score"].add(time.perf_counter() - t0)
+        self._counters["batches"] += 1
+        self._counters["queries"] += len(queries)
+        return results
+
+    async def query(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
+        fut = asyncio.get_running_loop().create_future()
+        await self._ensure_batcher().put((text, k, fut, time.perf_counter()))
+        try:
+            return await asyncio.wait_for(fut, self.timeout_s)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise HTTPError(504, "query timed out") from None
+
+    # -- request handling -----------------------------------------------------
+    def _parse_k(self, payload: Dict[str, Any]) -> int:
+        k = payload.get("k", 3)
+        if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= self.max_k:
+            raise HTTPError(400, f"k must be an integer in 1..{self.max_k}")
+        return k
+
+    async def handle(self, method: str, path: str, body: bytes = b"") -> Tuple[int, Dict[str, Any]]:
+        """Transport-free request handler: returns (status, JSON payload)."""
+        t0 = time.perf_counter()
+        self._counters["requests"] += 1
+        try:
+            status, payload = 200, await self._dispatch(method, path, body)
+        except HTTPError as exc:
+            status, payload = exc.status, {"error": str(exc)}
+        except Exception as exc:
+            status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+        if status != 200:
+            self._counters["errors"] += 1
+        self._latency["request"].add(time.perf_counter() - t0)
+        return status, payload
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Dict[str, Any]:
+        if path == "/health":
+            return {"status": "ok", "docs": len(self.retriever)}
+        if path == "/stats":
+            return self.stats()
+        if path not in ("/query", "/query_batch"):
+            raise HTTPError(404, f"no route for {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} expects POST")
+        if len(body) > self.max_body_bytes:
+            raise HTTPError(413, "request body too large")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON") from None
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        k = self._parse_k(payload)
+        if path == "/query":
+            q = payload.get("q")
+            if not isinstance(q, str):
+                raise HTTPError(400, "'q' must be a string")
+            return {"query": q, "results": await self.query(q, k)}
+        queries = payload.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise HTTPError(400, "'queries' must be a list of strings")
+        if len(queries) > self.max_queries:
+            raise HTTPError(413, f"at most {self.max_queries} queries per request")
+        try:
+            results = await asyncio.wait_for(self._score(queries, k), self.timeout_s)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise HTTPError(504, "query_batch timed out") from None
+        return {"results": results}
+
+    def stats(self) -> Dict[str, Any]:
+        cache_stats = getattr(self.retriever, "cache_stats", None)
+        return {
+            **self._counters,
+            "docs": len(self.retriever),
+            "cache": cache_stats() if cache_stats else None,
+            "latency": {stage: lat.summary() for stage, lat in self._latency.items()},
+        }
+
+    # -- HTTP transport -------------------------------------------------------
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > 65536:
+            raise HTTPError(413, "headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length > self.max_body_bytes:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], body
+
+    async def _serve_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                method, path, body = await asyncio.wait_for(self._read_request(reader), self.timeout_s)
+                status, payload = await self.handle(method, path, body)
+            except HTTPError as exc:
+                status, payload = exc.status, {"error": str(exc)}
+            except asyncio.TimeoutError:
+                status, payload = 408, {"error": "timed out reading request"}
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                status, payload = 400, {"error": "malformed request"}
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractServer:
+        self._ensure_batcher()
+        return await asyncio.start_server(self._serve_conn, host, port)
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher, self._queue = None, None
+        self._pool.shutdown(wait=False)
+
+async def http_request(
+    host: str, port: int, method: str, path: str, payload: Any = None
+) -> Tuple[int, Dict[str, Any]]:
+    """Minimal HTTP/1.1 JSON client, enough to exercise the server in-process."""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, data = raw.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, json.loads(data or b"{}")
+
+def run_server(server: QueryServer, host: str = "127.0.0.1", port: int = 8000) -> None:
+    async def main() -> None:
+        srv = await server.start(host, port)
+        async with srv:
+            await srv.serve_forever()
+    asyncio.run(main())
@@ -0,0 +1,226 @@
+"""
+BM25 over documents partitioned into contiguous shards, each held by its own
+worker process (built from documents, or loaded from a persisted index).
+
+All shards share one vocabulary in corpus first-occurrence order and are given
+the corpus-wide idf and avgdl, so every score equals the unsharded
+BM25Retriever's bit for bit. Queries are sent to all shards before any reply
+is read, so shards score in parallel; per-shard top-k lists are heap-merged,
+ties going to the lower global row as in InvertedIndex.top_k.
+"""
+from __future__ import annotations
+import heapq
+import json
+import multiprocessing as mp
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterable, List, Sequence, Tuple
+import numpy as np
+from .index import load_index, save_index
+from .retriever import BM25Retriever, bm25_idf, encode_docs
+
+SHARDS_META = "shards.json"
+
+def _shard_main(conn, spec: Tuple) -> None:
+    if spec[0] == "docs":
+        _, docs, ids, params = spec
+        encoded = encode_docs(docs)
+        conn.send(encoded[0])  # local terms, in first-occurrence order
+        r = BM25Retriever(**params)
+        r.index.vocab.update((t, i) for i, t in enumerate(conn.recv()))
+        r.add_encoded(docs, ids, *encoded)
+    else:
+        r = load_index(spec[1])
+        conn.send(sorted(r.index.vocab, key=r.index.vocab.__getitem__))
+        conn.recv()
+    idx = r.index
+    df = np.zeros(len(idx.vocab), dtype=np.int64)
+    df[: len(idx.df)] = idx.df
+    conn.send((df, idx.n_live, idx.total_len, [r.id_at(i) for i in range(idx.n_rows)]))
+    while True:
+        cmd, args = conn.recv()
+        if cmd == "close":
+            break
+        try:
+            if cmd == "stats":
+                idx.set_global_stats(*args)
+                result: Any = None
+            elif cmd == "query_rows":
+                result = r.query_rows(*args)
+            elif cmd == "query_batch":
+                result = r.query_batch(*args)
+            elif cmd == "docs":
+                result = [r.doc_at(row) for row in args[0]]
+            elif cmd == "save":
+                result = str(save_index(r, args[0]))
+            else:
+                raise ValueError(f"unknown command {cmd!r}")
+            conn.send(("ok", result))
+        except Exception as exc:  # surface worker errors in the parent
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+    conn.close()
+
+class ShardedRetriever:
+    """
+    Scatter-gather BM25 over n_shards worker processes. Documents are split into
+    contiguous, near-equal ranges, so global row = shard offset + local row.
+    Supports query/query_rows/query_batch and the doc accessors eval uses.
+    """
+    def __init__(self, specs: List[Tuple], k1: float, b: float, epsilon: float) -> None:
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        ctx = mp.get_context()
+        self._conns = []
+        self._procs = []
+        for spec in specs:
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_shard_main, args=(child, spec), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        # one vocabulary for all shards, in corpus first-occurrence order
+        terms = [c.recv() for c in self._conns]
+        if any(spec[0] == "index" for spec in specs) and any(t != terms[0] for t in terms):
+            self.close()
+            raise ValueError("persisted shards must share one vocabulary; write them with save()")
+        vocab = list(dict.fromkeys(t for shard_terms in terms for t in shard_terms))
+        for c in self._conns:
+            c.send(vocab)
+        df = np.zeros(len(vocab), dtype=np.int64)
+        n_live = total_len = 0
+        self._ids: List[str] = []
+        self.offsets = [0]
+        for c in self._conns:
+            shard_df, n, total, ids = c.recv()
+            df[: len(shard_df)] += shard_df
+            n_live += n
+            total_len += total
+            self._ids.extend(ids)
+            self.offsets.append(len(self._ids))
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        if n_live:
+            avgdl = total_len / n_live
+            self._scatter("stats", [(bm25_idf(df, n_live, epsilon), avgdl)] * len(self._conns))
+
+    @classmethod
+    def from_docs(
+        cls,
+        docs: List[str],
+        ids: List[str] | None = None,
+        n_shards: int = 2,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> ShardedRetriever:
+        if ids is None:
+            ids = [str(i) for i in range(len(docs))]
+        if len(ids) != len(docs):
+            raise ValueError("ids and docs must have same length")
+        if len(set(ids)) != len(ids):
+            raise ValueError("doc ids must be unique")
+        n_shards = max(1, min(n_shards, len(docs)))
+        bounds = np.linspace(0, len(docs), n_shards + 1).astype(int)
+        params = {"k1": k1, "b": b, "epsilon": epsilon}
+        specs = [("docs", docs[lo:hi], ids[lo:hi], params) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        return cls(specs, k1, b, epsilon)
+
+    @classmethod
+    def open(cls, index_dir: str | Path) -> ShardedRetriever:
+        """Load shards written by save(); each worker memory-maps its own index."""
+        p = Path(index_dir)
+        meta = json.loads((p / SHARDS_META).read_text(encoding="utf-8"))
+        specs = [("index", str(p / name)) for name in meta["shards"]]
+        return cls(specs, meta["k1"], meta["b"], meta["epsilon"])
+
+    def save(self, out_dir: str | Path) -> Path:
+        """Persist each shard as a regular index under out_dir/shard_NNN plus shards.json."""
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        names = [f"shard_{i:03d}" for i in range(len(self._conns))]
+        self._scatter("save", [(str(out / name),) for name in names])
+        meta = {"shards": names, "k1": self.k1, "b": self.b, "epsilon": self.epsilon}
+        (out / SHARDS_META).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        return out
+
+    def _scatter(self, cmd: str, args: Sequence[Tuple]) -> List[Any]:
+        for c, a in zip(self._conns, args):
+            c.send((cmd, a))
+        replies = [c.recv() for c in self._conns]
+        errors = [msg for status, msg in replies if status == "error"]
+        if errors:
+            raise RuntimeError(f"shard failed: {errors[0]}")
+        return [result for _, result in replies]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._row_of
+
+    @property
+    def n_shards(self) -> int:
+        return len(self._conns)
+
+    def _merge(self, per_shard: Iterable[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        lists = [
+            [(-s, row + off) for row, s in zip(rows.tolist(), scores.tolist())]
+            for (rows, scores), off in zip(per_shard, self.offsets)
+        ]
+        best = list(islice(heapq.merge(*lists), k))
+        return (
+            np.array([row for _, row in best], dtype=np.int64),
+            np.array([-neg for neg, _ in best], dtype=np.float64),
+        )
+
+    def query_rows(self, text: str, k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        return self._merge(self._scatter("query_rows", [(text, k)] * self.n_shards), k)
+
+    def query_batch(self, queries: List[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        per_shard = self._scatter("query_batch", [(list(queries), k)] * self.n_shards)
+        width = min(k, len(self))
+        out_rows = np.zeros((len(queries), width), dtype=np.int64)
+        out_scores = np.zeros((len(queries), width))
+        for i in range(len(queries)):
+            out_rows[i], out_scores[i] = self._merge(((r[i], s[i]) for r, s in per_shard), k)
+        return out_rows, out_scores
+
+    def query(self, text: str, k: int = 3) -> List[Tuple[str, float]]:
+        rows, scores = self.query_rows(text, k=k)
+        return [(self._ids[i], s) for i, s in zip(rows.tolist(), scores.tolist())]
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row]
+
+    def row_of(self, doc_id: str) -> int:
+        return self._row_of[doc_id]
+
+    def get_docs(self, ids: Iterable[str]) -> List[str]:
+        rows = [self._row_of[i] for i in ids]
+        shard_of = np.searchsorted(self.offsets, rows, side="right") - 1
+        wanted: List[List[int]] = [[] for _ in self._conns]
+        for row, s in zip(rows, shard_of.tolist()):
+            wanted[s].append(row - self.offsets[s])
+        fetched = [iter(texts) for texts in self._scatter("docs", [(w,) for w in wanted])]
+        return [next(fetched[s]) for s in shard_of.tolist()]
+
+    def get_doc(self, doc_id: str) -> str:
+        return self.get_docs([doc_id])[0]
+
+    def doc_at(self, row: int) -> str:
+        return self.get_docs([self._ids[row]])[0]
+
+    def close(self) -> None:
+        for c in self._conns:
+            try:
+                c.send(("close", ()))
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self._procs:
+            p.join(timeout=5)
+        self._conns, self._procs = [], []
+
+    def __enter__(self) -> ShardedRetriever:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
@@ -0,0 +1,23 @@
+from pubmed_rag_demo.bench import parse_sizes, run_bench, synthetic_corpus, synthetic_qa, write_results
+
+def test_synthetic_corpus_is_seeded_and_prefix_stable():
+    docs, ids = synthetic_corpus(120, seed=3, vocab_size=2_000)
+    again, _ = synthetic_corpus(120, seed=3, vocab_size=2_000)
+    small, _ = synthetic_corpus(50, seed=3, vocab_size=2_000)
+    other, _ = synthetic_corpus(50, seed=4, vocab_size=2_000)
+    assert docs == again and docs[:50] == small and other != small
+    assert ids[0] == "SYN0000000" and len(set(ids)) == 120
+    qa = synthetic_qa(docs, 10, seed=3, vocab_size=2_000)
+    assert len(qa) == 10 and all(a in q for q, a in qa)
+    assert parse_sizes("10k, 2.5k,1m,300") == [10_000, 2_500, 1_000_000, 300]
+
+def test_run_bench_rows_and_outputs(tmp_path):
+    rows = run_bench([200], ["bm25", "compact"], isolate=False, n_queries=20, k=5, vocab_size=2_000)
+    assert [r["retriever"] for r in rows] == ["bm25", "compact"]
+    for r in rows:
+        assert r["n_docs"] == 200 and r["n_queries"] == 20 and r["qps"] > 0
+        assert r["hit_rate"] > 0.5 and r["p50_ms"] <= r["p99_ms"]
+    assert rows[1]["index_mb"] < rows[0]["index_mb"]
+    write_results(rows, tmp_path / "bench.json", tmp_path / "bench.md")
+    md = (tmp_path / "bench.md").read_text().splitlines()
+    assert md[0].startswith("| docs | retriever") and len(md) == 4
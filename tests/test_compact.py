@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.compact import (
+    CompactBM25Retriever, FrontCodedVocab, decode_throughput, retriever_nbytes,
+    quantize_tfs, varbyte_decode, varbyte_encode,
+)
+from pubmed_rag_demo.eval import context_hit_rate
+
+def test_varbyte_and_front_coding_roundtrip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2**31, 2**40 + 5])
+    assert varbyte_decode(varbyte_encode(values)).tolist() == values.tolist()
+    terms = {t: i for i, t in enumerate(["insulin", "insulinoma", "ins", "brain", "mri", "é", "z" * 300])}
+    vocab = FrontCodedVocab(terms, block=3)
+    assert [vocab.get(t) for t in terms] == list(terms.values())
+    assert vocab.get("insul") is None and "aaa" not in vocab and vocab.get("zzz") is None
+    assert [vocab.key_at(i) for i in range(len(vocab))] == sorted(terms, key=lambda t: t.encode())
+
+def test_compact_retriever_scores_equal_in_memory_index():
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(300)]
+    docs = [" ".join(rng.choice(words, rng.integers(3, 80))) for _ in range(400)]
+    docs[5] += " w1" * 400  # tf beyond uint8 range
+    r = BM25Retriever()
+    r.add(docs, ids=[f"PMID{i:05d}" for i in range(len(docs))])
+    r.delete(["PMID00002"])
+    plain = retriever_nbytes(r)
+    version, row = r.version, r.row_of("PMID00300")
+    c = CompactBM25Retriever(r)
+    assert r.version == version and r.row_of("PMID00300") == row  # packed from a snapshot
+    for q in ["w1 w2", "w299 w299 w7", "w5 unknown", "nothing"]:
+        assert r.query(q, k=5) == c.query(q, k=5)
+    assert c.query("w1", k=1)[0][0] == "PMID00005" and c.get_doc("PMID00005") == docs[5]
+    assert "PMID00002" not in c and c.id_at(c.row_of("PMID00300")) == "PMID00300"
+    report = c.memory_report()
+    assert report["postings"] + report["tfs"] < plain["postings"] + plain["tfs"]
+    assert report["bytes_per_doc"] < plain["bytes_per_doc"]
+    assert decode_throughput(c, repeats=1) > 0
+    assert context_hit_rate([("w1 w2", "w1")], c, k=1)["hit_rate"] == 1.0
+    with pytest.raises(ValueError):
+        quantize_tfs(np.array([1, 70_000]))
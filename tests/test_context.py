@@ -0,0 +1,66 @@
+from pubmed_rag_demo.context import ContextAssembler, MinHasher, approx_tokens, similarity
+from pubmed_rag_demo.eval import retrieve_all
+from pubmed_rag_demo.llm import LLM
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.run_eval import context_assembler, llm_candidates
+
+DOCS = [
+    "Insulin lowers blood glucose after meals. This study was funded by the national institutes of health.",
+    "Metformin also lowers blood glucose in type 2 diabetes. This study was funded by the national institutes of health!",
+    "MRI imaging detects brain changes in dementia.",
+]
+
+def test_minhash_flags_near_duplicates_only():
+    h = MinHasher(num_perm=128)
+    a = h.signature("This study was funded by the national institutes of health.")
+    b = h.signature("this study was funded by the National Institutes of Health!")
+    c = h.signature("Metformin lowers blood glucose in type 2 diabetes.")
+    assert similarity(a, b) == 1.0 and similarity(a, c) < 0.2
+    assert approx_tokens("glucose") == 2 and approx_tokens("a b c d e") == 5
+
+def test_assembler_budgets_dedupes_and_caches_per_index_version():
+    r = BM25Retriever()
+    r.add(DOCS, ids=["insulin", "metformin", "mri"])
+    q = "which drugs lower blood glucose funded by health institutes"
+    ranked = r.query(q, k=3)
+    asm = ContextAssembler(r, max_tokens=64)
+    ctx = asm.assemble(q, ranked).split("\n")
+    # evidence from both glucose abstracts, the shared funding sentence once
+    assert sum("glucose" in s for s in ctx) == 2
+    assert sum("funded" in s for s in ctx) == 1 and asm.duplicates_skipped == 1
+    assert sum(approx_tokens(s) for s in ctx) <= 64
+    assert len(ContextAssembler(r, max_tokens=12).assemble(q, ranked).split("\n")) == 1
+
+    asm.assemble(q, ranked)
+    assert asm.cache.hits == 1
+    r.add(["Glucose monitoring in athletes."], ids=["athletes"])
+    asm.assemble(q, ranked)
+    assert asm.cache.hits == 1 and asm.cache.misses == 2
+
+def test_budget_counts_separators():
+    r = BM25Retriever()
+    r.add(DOCS, ids=["insulin", "metformin", "mri"])
+    q = "which drugs lower blood glucose funded by health institutes"
+    ranked = r.query(q, k=3)
+    sep = " ||| "  # two tokens
+    parts = ContextAssembler(r, max_tokens=1000, separator=sep).assemble(q, ranked).split(sep)
+    full = sum(approx_tokens(p) for p in parts) + (len(parts) - 1) * approx_tokens(sep)
+    exact = ContextAssembler(r, max_tokens=full, separator=sep).assemble(q, ranked)
+    assert exact.split(sep) == parts and approx_tokens(exact) <= full
+    tight = ContextAssembler(r, max_tokens=full - 1, separator=sep).assemble(q, ranked).split(sep)
+    assert len(tight) < len(parts)
+    head = ContextAssembler(r, max_tokens=3).assemble(q, ranked)
+    assert 0 < approx_tokens(head) <= 3
+
+def test_llm_candidates_use_assembled_context(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    r = BM25Retriever()
+    r.add(DOCS, ids=["insulin", "metformin", "mri"])
+    qa = [("what detects brain changes", "MRI"), ("metformin diabetes glucose", "Metformin")]
+    results = retrieve_all((q for q, _ in qa), r, k=3)
+    cands = llm_candidates(qa, r, results=results, llm=LLM(), concurrency=1, context_tokens=64)
+    # the offline fallback answers with the first (best-matching) sentence of the context
+    assert cands == ["MRI imaging detects brain changes in dementia", "Metformin also lowers blood glucose in type 2 diabetes"]
+    # later calls reuse the retriever's assembler and its cached contexts
+    assert llm_candidates(qa, r, results=results, llm=LLM(), concurrency=1, context_tokens=64) == cands
+    assert context_assembler(r, 64).cache.hits == 2
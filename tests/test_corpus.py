@@ -12,3 +12,58 @@ def test_load_txt_corpus_reads_nonempty_txt_files(tmp_path):
     assert len(docs) == 2
     assert set(ids) == {"a", "b"}
     assert "Insulin" in docs[0] or "Insulin" in docs[1]
+
+def test_parallel_encoded_chunks_build_identical_index(tmp_path):
+    import numpy as np
+    from pubmed_rag_demo.corpus import iter_encoded_txt_chunks
+    from pubmed_rag_demo.retriever import BM25Retriever
+
+    words = ["insulin", "glucose", "brain", "mri", "therapy", "patients", "study"]
+    rng = np.random.default_rng(0)
+    for i in range(25):
+        text = " ".join(rng.choice(words, size=rng.integers(0, 12)))
+        (tmp_path / f"doc{i:02d}.txt").write_text(text, encoding="utf-8")
+
+    serial = BM25Retriever()
+    serial.add(*load_txt_corpus(tmp_path))
+    parallel = BM25Retriever()
+    for chunk in iter_encoded_txt_chunks(tmp_path, workers=2, chunk_size=4):
+        parallel.add_encoded(*chunk)
+
+    assert parallel.index.vocab == serial.index.vocab
+    assert parallel._doc_ids == serial._doc_ids
+    for q in ["insulin glucose", "study patients brain"]:
+        assert parallel.query(q, k=10) == serial.query(q, k=10)
+
+def test_streaming_loaders_for_csv_jsonl_and_pubmed_xml(tmp_path):
+    import gzip
+    import json
+    import pytest
+    from pubmed_rag_demo.corpus import (
+        iter_corpus, iter_csv_corpus, iter_jsonl_corpus, iter_pubmed_xml,
+    )
+
+    pairs = list(iter_csv_corpus("sample_dataset/sample.csv", schema="contracts/schema.json"))
+    assert [i for i, _ in pairs] == ["1", "2", "3"]
+    assert pairs[0][1].startswith("Insulin")
+
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text(json.dumps({"id": "x", "text": "t", "label": "other"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="row 0"):
+        list(iter_jsonl_corpus(bad, schema="contracts/schema.json"))
+
+    xml = tmp_path / "pubmed.xml.gz"
+    with gzip.open(xml, "wt", encoding="utf-8") as f:
+        f.write(
+            "<PubmedArticleSet>"
+            "<PubmedArticle><MedlineCitation><PMID>101</PMID><Article>"
+            "<ArticleTitle>Insulin <i>in vivo</i></ArticleTitle>"
+            "<Abstract><AbstractText>Lowers glucose.</AbstractText>"
+            "<AbstractText>In mice.</AbstractText></Abstract>"
+            "</Article></MedlineCitation></PubmedArticle>"
+            "<PubmedArticle><MedlineCitation><PMID>102</PMID><Article>"
+            "<ArticleTitle></ArticleTitle></Article></MedlineCitation></PubmedArticle>"
+            "</PubmedArticleSet>"
+        )
+    assert list(iter_pubmed_xml(xml)) == [("101", "Insulin in vivo Lowers glucose. In mice.")]
+    assert list(iter_corpus(xml)) == list(iter_pubmed_xml(xml))
@@ -0,0 +1,37 @@
+import numpy as np
+from pubmed_rag_demo.dense import DenseRetriever, TfidfSvdEncoder
+from pubmed_rag_demo.eval import ann_recall_latency, context_hit_rate
+
+def _corpus(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = [[f"t{t}w{i}" for i in range(30)] for t in range(8)]
+    return [" ".join(rng.choice(topics[i % 8], 20)) for i in range(n)]
+
+def test_exact_blocked_search_memmap_and_ivf(tmp_path):
+    docs = _corpus()
+    r = DenseRetriever(path=tmp_path / "vectors.f32", block_rows=64)
+    r.add(docs[:150])
+    r.add(docs[150:], ids=[str(i) for i in range(150, len(docs))])
+    assert (tmp_path / "vectors.f32").stat().st_size >= r.vectors.nbytes
+
+    queries = docs[:20]
+    rows, scores = r.query_batch(queries, k=5)
+    brute = np.asarray(r.vectors) @ r._encode(queries).T
+    for i in range(len(queries)):
+        assert rows[i, 0] == i
+        np.testing.assert_allclose(scores[i], np.sort(brute[:, i])[::-1][:5], rtol=1e-5)
+    assert r.query(docs[3], k=1)[0][0] == "3"
+
+    r.build_ivf(n_lists=8)
+    report = ann_recall_latency(queries, r, k=5, nprobes=(1, 8))
+    assert report[0]["nprobe"] == 0 and report[-1]["recall_at_k"] == 1.0
+    assert 0.0 < report[1]["recall_at_k"] <= 1.0
+
+    r.add(["t0w1 t0w2 t0w3"], ids=["late"])  # assigned to an existing list
+    assert r.query("t0w1 t0w2 t0w3", k=1, nprobe=8)[0][0] == "late"
+
+def test_svd_encoder_plugs_into_eval_metrics():
+    docs = ["insulin lowers blood glucose", "mri scans image the brain", "glucose and insulin in diabetes"]
+    r = DenseRetriever(encoder=TfidfSvdEncoder(dim=2).fit(docs))
+    r.add(docs, ids=["a", "b", "c"])
+    assert context_hit_rate([("insulin glucose", "glucose")], r, k=1)["hit_rate"] == 1.0
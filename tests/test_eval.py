@@ -11,3 +11,53 @@ def test_context_hit_rate_simple():
     qa_pairs = [("what regulates glucose?", "glucose")]
     metrics = context_hit_rate(qa_pairs, r, k=2)
     assert metrics["hit_rate"] == 1.0
+
+def test_query_batch_matches_single_queries_and_feeds_metrics():
+    import numpy as np
+    from pubmed_rag_demo.eval import retrieve_all, retrieval_precision_at_k
+
+    docs = [
+        "Insulin therapy regulates blood glucose.",
+        "MRI imaging detects brain changes.",
+        "Dietary changes can lower glucose spikes.",
+        "Antibiotics reduce infection rates.",
+    ]
+    r = BM25Retriever()
+    r.add(docs, ids=["insulin", "mri", "diet", "antibiotic"])
+    questions = ["what regulates glucose?", "brain imaging", "unrelated words"]
+    rows, scores = r.query_batch(questions, k=3)
+    for q, rr, ss in zip(questions, rows, scores):
+        single_rows, single_scores = r.query_rows(q, k=3)
+        assert rr.tolist() == single_rows.tolist()
+        np.testing.assert_allclose(ss, single_scores)
+
+    qa_pairs = [(q, "glucose") for q in questions]
+    results = retrieve_all(questions, r, k=3)
+    assert results[0][0][0] == "insulin"
+    assert retrieval_precision_at_k(qa_pairs, r, k=2, results=results) == \
+        retrieval_precision_at_k(qa_pairs, r, k=2)
+
+def test_evaluate_multi_k_matches_per_k_metrics():
+    import pytest
+    from pubmed_rag_demo.eval import (
+        evaluate_multi_k, faithfulness_overlap, retrieval_precision_at_k,
+    )
+
+    docs = [
+        "Insulin therapy regulates blood glucose.",
+        "MRI imaging detects brain changes.",
+        "Dietary changes can lower glucose spikes.",
+    ]
+    r = BM25Retriever()
+    r.add(docs, ids=["insulin", "mri", "diet"])
+    qa_pairs = [("what regulates glucose?", "glucose"), ("brain imaging", "imaging")]
+    cands = ["insulin regulates glucose", "banana"]
+    rows = evaluate_multi_k(qa_pairs, cands, r, max_k=3, threshold=0.5)
+    for row in rows:
+        k = row["k"]
+        assert row["hit_rate"] == context_hit_rate(qa_pairs, r, k=k)["hit_rate"]
+        assert row["precision_at_k"] == pytest.approx(
+            retrieval_precision_at_k(qa_pairs, r, k=k)["precision_at_k"]
+        )
+        assert row["faithfulness"] == \
+            faithfulness_overlap(qa_pairs, cands, r, k=k, threshold=0.5)["faithfulness"]
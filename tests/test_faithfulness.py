@@ -21,3 +21,27 @@ def test_faithfulness_overlap_flags_hallucination():
     candidates = ["banana therapy cures glucose"]  # nonsense not in evidence
     metrics = faithfulness_overlap(qa_pairs, candidates, r, k=1, threshold=0.5)
     assert metrics["faithfulness"] == 0.0
+
+def test_sparse_overlap_matches_tokenizing_each_doc():
+    from pubmed_rag_demo.eval import _faithful_flags, retrieve_all
+
+    class TextOnly:  # no doc_terms(): forces the per-document tokenizing path
+        def __init__(self, r):
+            self.get_docs = r.get_docs
+
+    docs = [
+        "Insulin therapy helps regulate blood glucose in diabetes.",
+        "MRI imaging detects structural brain changes.",
+        "Dietary changes lower glucose and insulin resistance.",
+        "Antibiotics reduce infection rates in surgery.",
+    ]
+    r = BM25Retriever()
+    r.add(docs, ids=["insulin", "mri", "diet", "abx"])
+    r.delete(["mri"])
+    r.add(["Brain MRI changes in diabetes."], ids=["mri2"])
+    questions = ["glucose insulin", "brain changes", "infection", "nothing matches"]
+    cands = ["insulin regulates blood glucose", "brain mri changes", "the of", "banana glucose"]
+    per_q = retrieve_all(questions, r, k=3)
+    for threshold in (0.3, 0.6, 1.0):
+        assert (_faithful_flags(cands, per_q, r, 3, threshold)
+                == _faithful_flags(cands, per_q, TextOnly(r), 3, threshold)).all()
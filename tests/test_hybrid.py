@@ -0,0 +1,46 @@
+import threading
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.hybrid import HybridRetriever
+from pubmed_rag_demo.eval import context_hit_rate, retrieve_all
+
+DOCS = [
+    "Insulin therapy regulates blood glucose.",
+    "MRI imaging detects brain changes.",
+    "Dietary changes can lower glucose spikes.",
+    "Antibiotics reduce infection rates.",
+]
+IDS = ["insulin", "mri", "diet", "abx"]
+
+class FixedRanking:
+    """query()-only retriever returning a fixed ranking; waits on a barrier to prove concurrency."""
+    def __init__(self, ranking, barrier=None):
+        self.ranking = ranking
+        self.barrier = barrier
+
+    def query(self, text, k=3):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        return self.ranking[:k]
+
+def test_rrf_fuses_concurrent_sub_retrievers():
+    bm25 = BM25Retriever()
+    bm25.add(DOCS, ids=IDS)
+    barrier = threading.Barrier(2)  # deadlocks unless both run at the same time
+    a = FixedRanking([("abx", 9.0), ("diet", 5.0)], barrier)
+    b = FixedRanking([("diet", 0.9)], barrier)
+    h = HybridRetriever([bm25, a, b], fetch_k=4)
+    fused = dict(h.query("glucose", k=4))
+    lex_rank = {d: i + 1 for i, (d, _) in enumerate(bm25.query("glucose", k=4))}
+    assert fused["diet"] == 1 / (60 + lex_rank["diet"]) + 1 / 62 + 1 / 61
+    assert fused["abx"] == 1 / (60 + lex_rank["abx"]) + 1 / 61
+    assert [d for d, _ in h.query("glucose", k=2)] == ["diet", "abx"]
+
+def test_weighted_fusion_plugs_into_eval():
+    bm25 = BM25Retriever()
+    bm25.add(DOCS, ids=IDS)
+    other = FixedRanking([("mri", 3.0), ("insulin", 1.0)])
+    h = HybridRetriever([bm25, other], fusion="weighted", weights=[1.0, 0.5])
+    results = retrieve_all(["what regulates glucose?"], h, k=2)
+    assert results[0] == h.query("what regulates glucose?", k=2)
+    assert results[0][0][0] == "insulin"
+    assert context_hit_rate([("what regulates glucose?", "glucose")], h, k=1)["hit_rate"] == 1.0
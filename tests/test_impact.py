@@ -0,0 +1,40 @@
+import numpy as np
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.impact import PrunedRetriever
+from pubmed_rag_demo.eval import pruning_tradeoff
+
+def _corpus(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    p = 1 / np.arange(1, 501) ** 1.1
+    p /= p.sum()
+    return [" ".join(f"w{i}" for i in rng.choice(500, rng.integers(5, 60), p=p)) for _ in range(n)]
+
+def test_unpruned_impact_order_matches_exhaustive_bm25():
+    r = BM25Retriever()
+    r.add(_corpus())
+    r.delete(["3", "10"])
+    pruned = PrunedRetriever(r, block=32)
+    queries = ["w0 w1", "w7 w7 w300", "w499 w2 w40 w41", "w0", "unknown", "w450 unknown"]
+    for q in queries:
+        rows, scores = r.query_rows(q, k=10)
+        p_rows, p_scores = pruned.query_rows(q, k=10)
+        assert rows.tolist() == p_rows.tolist() and scores.tolist() == p_scores.tolist()
+    assert pruned.postings_scored < sum(
+        int(r.index.df[r.index.vocab[t]]) for q in queries for t in q.split() if t in r.index.vocab
+    )
+    r.add(["w450 w450 w450"], ids=["late"])  # impact index is rebuilt for the new version
+    assert pruned.query("w450", k=1) == r.query("w450", k=1)
+
+def test_zero_idf_terms_and_pruning_report():
+    r = BM25Retriever()
+    r.add(["insulin glucose", "mri brain"], ids=["a", "b"])  # df == n/2: idf is exactly 0
+    assert PrunedRetriever(r).query("insulin mri", k=2) == r.query("insulin mri", k=2)
+
+    r = BM25Retriever()
+    r.add(_corpus(800))
+    qa = [("w5 w80", "w80"), ("w9 w120", "w9")]
+    report = pruning_tradeoff(qa, r, k=3, budgets=(1.0, 0.2))
+    assert report[0]["budget"] is None and report[1]["hit_rate_loss"] == 0.0
+    assert report[1]["precision_at_k"] == report[0]["precision_at_k"]
+    assert 0.2 <= report[2]["postings_kept"] < 1.0  # min_keep postings per term are always kept
+    assert report[2]["postings_per_query"] < report[0]["postings_per_query"]
@@ -13,3 +13,57 @@ def test_build_and_query(tmp_path):
     assert results, "should return at least one match"
     top_ids = [rid for rid, _ in results]
     assert top_ids[0] == "insulin"
+
+def test_saved_index_roundtrip_and_rebuild_on_change(tmp_path):
+    import os
+    from pubmed_rag_demo.index import load_index, open_index
+
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "insulin.txt").write_text("Insulin therapy helps regulate blood glucose.", encoding="utf-8")
+    (data / "mri.txt").write_text("MRI imaging reveals structural brain changes.", encoding="utf-8")
+    index_dir = tmp_path / "idx"
+
+    fresh = build_bm25_from_dir(data)
+    r = open_index(data, index_dir)
+    assert (index_dir / "meta.json").exists()
+    assert r.query("brain imaging", k=2) == fresh.query("brain imaging", k=2)
+    assert load_index(index_dir)._docs[0].startswith("Insulin")
+
+    (data / "diet.txt").write_text("Diet changes lower glucose spikes.", encoding="utf-8")
+    os.utime(data / "diet.txt", ns=(1, 1))
+    r2 = open_index(data, index_dir)
+    assert len(r2) == 3
+    assert "diet" in [i for i, _ in r2.query("diet", k=1)]
+
+    from pubmed_rag_demo.index import save_index
+    fresh.delete(["insulin"])
+    version = fresh.version
+    save_index(fresh, tmp_path / "saved")
+    assert fresh.version == version and fresh.row_of("mri") == 1  # saving does not compact the caller
+    assert load_index(tmp_path / "saved").query("brain", k=1) == fresh.query("brain", k=1)
+    save_index(fresh, tmp_path / "saved")  # replaces the existing index; staging dirs are unique and cleaned up
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("saved")) == ["saved"]
+
+def test_external_build_matches_in_memory_index(tmp_path):
+    import numpy as np
+    from pubmed_rag_demo.corpus import iter_encoded_chunks, iter_txt_corpus
+    from pubmed_rag_demo.index import build_index_external, load_index
+
+    data = tmp_path / "data"
+    data.mkdir()
+    words = ["insulin", "glucose", "brain", "mri", "therapy", "patients", "study", "diet"]
+    rng = np.random.default_rng(0)
+    for i in range(40):
+        text = " ".join(rng.choice(words[: 3 + i % 6], size=rng.integers(1, 15)))
+        (data / f"doc{i:02d}.txt").write_text(text, encoding="utf-8")
+
+    # a ~2KB budget forces many spilled runs and many merge ranges
+    chunks = iter_encoded_chunks(iter_txt_corpus(data), chunk_size=3)
+    build_index_external(chunks, tmp_path / "idx", memory_mb=0.002)
+    r = load_index(tmp_path / "idx")
+    ref = build_bm25_from_dir(data)
+    assert len(r) == len(ref) == 40
+    for q in ["insulin glucose", "diet study patients", "mri"]:
+        assert r.query(q, k=40) == ref.query(q, k=40)
+    assert r.get_doc("doc07") == ref.get_doc("doc07")
@@ -0,0 +1,50 @@
+import threading
+from types import SimpleNamespace
+from pubmed_rag_demo.llm import LLM
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class FakeClient:
+    """Stands in for openai.OpenAI: echoes the question, failing the first `flaky` calls with `status`."""
+    def __init__(self, flaky: int = 0, status: int = 429) -> None:
+        self.calls = 0
+        self.flaky = flaky
+        self.status = status
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, max_tokens, temperature):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.flaky:
+                raise FakeAPIError(self.status)
+        question = messages[-1]["content"].split("Question: ")[1].split("\n")[0]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" {question} "))])
+
+def test_answer_many_is_ordered_retried_and_cached_on_disk(tmp_path):
+    pairs = [(f"q{i}", f"context {i}.") for i in range(20)]
+    client = FakeClient(flaky=2)
+    llm = LLM(client=client, cache_dir=tmp_path, backoff_s=0.0, requests_per_s=1000)
+    assert llm.answer_many(pairs, concurrency=4) == [f"q{i}" for i in range(20)]
+    assert client.calls == 22  # two transient failures were retried
+
+    again = FakeClient()
+    cached = LLM(client=again, cache_dir=tmp_path)
+    assert cached.answer_many(pairs, concurrency=4) == [f"q{i}" for i in range(20)]
+    assert again.calls == 0 and cached.cache.hits == 20
+    # a different max_tokens is a different prompt
+    cached.answer("q0", "context 0.", max_tokens=16)
+    assert again.calls == 1
+
+def test_answer_falls_back_when_retries_exhausted():
+    llm = LLM(client=FakeClient(flaky=10), max_retries=1, backoff_s=0.0)
+    assert llm.answer("q", "First sentence. Second.") == "First sentence"
+
+def test_only_transient_errors_are_retried():
+    client = FakeClient(flaky=10, status=401)
+    llm = LLM(client=client, max_retries=3, backoff_s=10.0)
+    assert llm.answer("q", "First sentence. Second.") == "First sentence"
+    assert client.calls == 1  # auth errors fall back at once, without backoff
@@ -0,0 +1,41 @@
+from pathlib import Path
+import pytest
+from pubmed_rag_demo.monitor import MONITOR, Monitor, profile_run
+from pubmed_rag_demo.retriever import BM25Retriever
+
+def test_stage_timers_counters_and_exports():
+    m = Monitor()
+    for _ in range(3):
+        with m.stage("eval.metrics"):
+            pass
+    with pytest.raises(ValueError), m.stage("llm.answer"):
+        raise ValueError("still timed")
+    m.timed("corpus.load")(lambda: None)()
+    m.incr("llm.retries", 2)
+    summary = m.summary()
+    assert list(summary["stages"]) == ["corpus.load", "eval.metrics", "llm.answer"]
+    assert summary["stages"]["eval.metrics"]["count"] == 3
+    assert summary["stages"]["llm.answer"]["p50_ms"] <= summary["stages"]["llm.answer"]["p99_ms"]
+    assert summary["counters"] == {"llm.retries": 2}
+    assert m.to_csv().splitlines()[0] == "stage,count,total_ms,p50_ms,p95_ms,p99_ms,max_ms"
+    prom = m.to_prometheus()
+    assert 'pubmed_rag_stage_seconds_count{stage="eval.metrics"} 3' in prom
+    assert 'pubmed_rag_events_total{event="llm.retries"} 2' in prom
+
+    off = Monitor(enabled=False)
+    with off.stage("x"):
+        off.incr("y")
+    assert off.summary() == {"stages": {}, "counters": {}}
+
+def test_pipeline_records_into_global_monitor_and_profile(tmp_path):
+    MONITOR.reset()
+    with profile_run(tmp_path / "prof") as paths:
+        r = BM25Retriever()
+        r.add(["insulin regulates glucose", "mri of the brain"])
+        r.query("insulin", k=1)
+        r.query_batch(["brain", "glucose"], k=1)
+    stages = MONITOR.summary()["stages"]
+    assert {"retriever.tokenize", "retriever.index", "retriever.score", "retriever.topk"} <= set(stages)
+    assert MONITOR.summary()["counters"]["retriever.queries"] == 3
+    assert "peak traced memory" in Path(paths["memory.txt"]).read_text()
+    assert "cumulative" in Path(paths["profile.txt"]).read_text()
@@ -0,0 +1,39 @@
+import re
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.passages import SentenceIndex, naive_candidates, sentence_spans
+
+def _reference(q, texts):
+    """The regex split + token-set scan the shared module replaces."""
+    def words(s):
+        return set(re.findall(r"[a-z0-9]+", s.lower()))
+
+    best_sent, best_score = "", -1
+    for text in texts:
+        for s in re.split(r"(?<=[.!?])\s+", text.strip()):
+            score = len(words(q) & words(s))
+            if score > best_score:
+                best_score, best_sent = score, s
+    return best_sent
+
+def test_sentence_index_matches_regex_scan_over_top_k_docs():
+    docs = [
+        "  Insulin is a hormone. It regulates blood glucose!  Levels rise after meals? ",
+        "MRI imaging detects brain changes. Glucose is not imaged.",
+        "Dietary changes lower glucose spikes. Insulin resistance improves with diet.",
+    ]
+    ids = ["insulin", "mri", "diet"]
+    for text in docs:
+        assert [text[s:e] for s, e in sentence_spans(text)] == re.split(r"(?<=[.!?])\s+", text.strip())
+
+    r = BM25Retriever()
+    r.add(docs, ids=ids)
+    qa_pairs = [("what regulates blood glucose?", ""), ("brain imaging", ""), ("zzz", "")]
+    index = SentenceIndex.build(r.iter_docs())
+    assert len(index) == 7
+    for k in (1, 2, 3):
+        cands = naive_candidates(qa_pairs, r, k_for_candidate=k, index=index)
+        expected = [
+            _reference(q, [r.get_doc(d) for d, _ in r.query(q, k=k)]) for q, _ in qa_pairs
+        ]
+        assert cands == expected
+        assert naive_candidates(qa_pairs, r, k_for_candidate=k) == expected
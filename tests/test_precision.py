@@ -13,3 +13,27 @@ def test_retrieval_precision_at_k():
     metrics = retrieval_precision_at_k(qa_pairs, r, k=3)
     # at least 2 of top-3 should contain 'glucose' (depending on ranking it could be 2/3 or 1/3, but never 0)
     assert 0.0 < metrics["precision_at_k"] <= 1.0
+
+def test_automaton_containment_matches_substring_checks():
+    from pubmed_rag_demo.containment import containment_matrix
+    from pubmed_rag_demo.eval import answer_containment, context_hit_rate, retrieve_all
+
+    docs = [
+        "Insulin therapy regulates BLOOD glucose.",
+        "MRI imaging detects structural brain changes.",
+        "Dietary changes can lower glucose spikes in patients.",
+    ]
+    r = BM25Retriever()
+    r.add(docs, ids=["insulin", "mri", "diet"])
+    qa_pairs = [("glucose?", "Blood Glucose"), ("brain", "brain change"), ("diet", "changes"),
+                ("none", "banana"), ("empty", "")]
+    per_q = retrieve_all([q for q, _ in qa_pairs], r, k=3)
+    answers = [a for _, a in qa_pairs]
+    expected = [[a.lower() in r.get_doc(d).lower() for d, _ in ranked] for a, ranked in zip(answers, per_q)]
+    for use_automaton in (False, True):
+        assert containment_matrix(answers, per_q, r, 3, use_automaton=use_automaton).tolist() == expected
+
+    contains = answer_containment(qa_pairs, r, k=3)
+    assert context_hit_rate(qa_pairs, r, k=2, contains=contains) == context_hit_rate(qa_pairs, r, k=2)
+    assert retrieval_precision_at_k(qa_pairs, r, k=3, contains=contains) == \
+        retrieval_precision_at_k(qa_pairs, r, k=3)
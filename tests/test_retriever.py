@@ -13,3 +13,125 @@ def test_bm25_retrieves_relevant_doc():
     assert "insulin" in top_ids
     # the insulin doc should rank above unrelated ones
     assert top_ids[0] == "insulin"
+
+def test_scores_match_bm25okapi():
+    import numpy as np
+    import pytest
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    from pubmed_rag_demo.retriever import _tokenize
+
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(40)]
+    docs = [" ".join(rng.choice(words, size=rng.integers(1, 30))) for _ in range(200)]
+    r = BM25Retriever()
+    r.add(docs)
+    ref = rank_bm25.BM25Okapi([_tokenize(d) for d in docs])
+    for q in ["w1 w2 w2", "w0 w39 zzz", "w5"]:
+        assert np.array_equal(r.get_scores(q), ref.get_scores(_tokenize(q)))
+
+def test_incremental_add_delete_update_match_rebuild():
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    words = [f"w{i}" for i in range(30)]
+    docs = {f"d{i}": " ".join(rng.choice(words, size=rng.integers(1, 20))) for i in range(60)}
+    ids = list(docs)
+    r = BM25Retriever()
+    for start in range(0, 60, 7):  # small batches exercise segment merging
+        batch = ids[start:start + 7]
+        r.add([docs[i] for i in batch], ids=batch)
+    r.delete(["d3", "d10"])
+    r.update(["w1 w2 w3", "w4 w4"], ids=["d5", "d99"])
+    del docs["d3"], docs["d10"], docs["d5"]
+    docs["d5"], docs["d99"] = "w1 w2 w3", "w4 w4"
+
+    ref = BM25Retriever()
+    ref.add(list(docs.values()), ids=list(docs))
+    for q in ["w1 w4", "w7 w7 w20"]:
+        assert sorted(r.query(q, k=60)) == sorted(ref.query(q, k=60))
+        assert [i for i, _ in r.query(q, k=5)] == [i for i, _ in ref.query(q, k=5)]
+    r.compact()
+    assert len(r) == len(ref) == 59
+    np.testing.assert_allclose(
+        np.sort(r.get_scores("w1 w4")), np.sort(ref.get_scores("w1 w4")), rtol=1e-12
+    )
+
+def test_duplicate_ids_never_leave_the_index_half_changed():
+    import pytest
+
+    r = BM25Retriever()
+    r.add(["alpha one", "beta two", "gamma"], ids=["a", "b", "c"])
+    r.delete(["a", "a"])
+    assert "a" not in r and [i for i, _ in r.query("alpha", k=2)] == ["b", "c"]
+    for docs, ids in [(["x", "y"], ["b", "b"]), (["x"], ["b", "c"])]:
+        with pytest.raises(ValueError):
+            r.update(docs, ids)
+    assert r.get_doc("b") == "beta two" and r.query("beta", k=1)[0][0] == "b"
+
+def test_queries_after_deleting_every_document():
+    r = BM25Retriever()
+    r.add(["alpha beta", "beta gamma"], ["a", "b"])
+    r.add(["beta delta"], ["x"])
+    r.delete(["a", "b", "x"])
+    assert r.query("beta") == [] and r.query("beta", prune=True) == []
+    rows, scores = r.query_batch(["beta", "zzz"], k=3)
+    assert rows.shape == scores.shape == (2, 0)
+
+def test_document_store_lookup():
+    r = BM25Retriever()
+    r.add(
+        ["Insulin lowers glucose.", "MRI shows brain changes.", "Antibiotics reduce infection."],
+        ids=["insulin", "mri", "antibiotic"],
+    )
+    assert r.get_doc("mri") == "MRI shows brain changes."
+    assert r.get_docs(["mri", "insulin"])[1] == "Insulin lowers glucose."
+    rows, scores = r.query_rows("brain", k=1)
+    assert r.id_at(int(rows[0])) == "mri" and scores[0] > 0
+    assert r.query_docs("brain", k=1)[0][:2] == ("mri", "MRI shows brain changes.")
+
+def test_topk_and_pruned_query_match_full_sort():
+    import numpy as np
+
+    from pubmed_rag_demo.retriever import _tokenize
+
+    rng = np.random.default_rng(2)
+    words = [f"w{i}" for i in range(200)]
+    p = 1.0 / np.arange(1, 201)
+    docs = [" ".join(rng.choice(words, size=rng.integers(3, 40), p=p / p.sum())) for _ in range(500)]
+    docs += ["w150 w151"] * 5  # exact ties
+    r = BM25Retriever()
+    r.add(docs)
+    r.delete(["7", "42"])
+    for q in ["w0 w1 w150", "w150 w151", "w3 w3 w90 w0", "w199 nothing"]:
+        scores = r.index.score(_tokenize(q))
+        expected = sorted(range(len(scores)), key=lambda i: float(scores[i]), reverse=True)[:10]
+        for prune in (False, True):
+            rows, top = r.query_rows(q, k=10, prune=prune)
+            assert rows.tolist() == expected
+            assert top.tolist() == scores[expected].tolist()
+
+def test_result_cache_hits_evicts_and_invalidates_on_add():
+    from pubmed_rag_demo.cache import LRUCache
+
+    r = BM25Retriever()
+    r.add(["insulin regulates glucose", "mri detects brain changes", "diet lowers glucose"],
+          ids=["a", "b", "c"])
+    r.enable_cache(maxsize=2)
+    first = r.query("Glucose insulin", k=2)
+    assert r.query("glucose, insulin!", k=2) == first  # same tokens after normalization
+    r.query("brain", k=2)
+    r.query("diet", k=2)  # evicts the oldest entry
+    assert r.cache_stats()["hits"] == 1 and r.cache_stats()["evictions"] == 1
+
+    rows, _ = r.query_batch(["brain", "diet", "glucose insulin"], k=2)
+    assert rows.tolist() == r.query_batch(["brain", "diet", "glucose insulin"], k=2)[0].tolist()
+
+    r.add(["insulin insulin glucose"], ids=["d"])
+    assert r.cache_stats()["size"] == 0
+    assert "d" in [i for i, _ in r.query("glucose insulin", k=4)]
+
+    now = [0.0]
+    c = LRUCache(maxsize=4, ttl=10, clock=lambda: now[0])
+    c.put("q", 1)
+    now[0] = 11
+    assert c.get("q") is None and c.expirations == 1
@@ -0,0 +1,62 @@
+import asyncio
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.server import QueryServer, http_request
+
+DOCS = [
+    "Insulin therapy regulates blood glucose.",
+    "MRI imaging detects brain changes.",
+    "Dietary changes can lower glucose spikes.",
+    "Antibiotics reduce infection rates.",
+]
+IDS = ["insulin", "mri", "diet", "antibiotic"]
+
+def _retriever():
+    r = BM25Retriever()
+    r.add(DOCS, ids=IDS)
+    return r
+
+def test_concurrent_queries_are_micro_batched_over_http():
+    r = _retriever()
+    questions = ["what regulates glucose?", "brain imaging", "infection", "glucose spikes"]
+
+    async def run():
+        server = QueryServer(r, batch_window_ms=50)
+        srv = await server.start("127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        try:
+            replies = await asyncio.gather(*(
+                http_request("127.0.0.1", port, "POST", "/query", {"q": q, "k": 2}) for q in questions
+            ))
+            batch = await http_request("127.0.0.1", port, "POST", "/query_batch", {"queries": questions, "k": 2})
+            stats = await http_request("127.0.0.1", port, "GET", "/stats")
+        finally:
+            srv.close()
+            await srv.wait_closed()
+            await server.close()
+        return replies, batch, stats
+
+    replies, (status, batch), (_, stats) = asyncio.run(run())
+    assert status == 200
+    for q, (code, body), batched in zip(questions, replies, batch["results"]):
+        assert code == 200
+        assert [tuple(x) for x in body["results"]] == [tuple(x) for x in r.query(q, k=2)]
+        assert body["results"] == batched
+    # the four concurrent /query calls share one scoring batch, plus one for /query_batch
+    assert stats["batches"] == 2 and stats["queries"] == 8
+    assert stats["latency"]["score"]["count"] == 2
+
+def test_rejects_bad_and_oversized_requests():
+    async def run():
+        server = QueryServer(_retriever(), max_body_bytes=64, max_k=10)
+        try:
+            return [
+                await server.handle("POST", "/query", b"not json"),
+                await server.handle("POST", "/query", b'{"q": "glucose", "k": 50}'),
+                await server.handle("POST", "/query", b'{"q": "' + b"x" * 100 + b'"}'),
+                await server.handle("GET", "/query"),
+                await server.handle("GET", "/nope"),
+            ]
+        finally:
+            await server.close()
+
+    assert [status for status, _ in asyncio.run(run())] == [400, 400, 413, 405, 404]
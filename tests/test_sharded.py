@@ -0,0 +1,32 @@
+import numpy as np
+from pubmed_rag_demo.retriever import BM25Retriever
+from pubmed_rag_demo.sharded import ShardedRetriever
+from pubmed_rag_demo.eval import retrieve_all
+
+def _corpus(n=60, seed=1):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(40)] + ["insulin", "glucose", "brain"]
+    return [" ".join(rng.choice(words, rng.integers(3, 15))) for _ in range(n)]
+
+def test_sharded_scores_equal_unsharded_and_survive_persistence(tmp_path):
+    docs = _corpus()
+    ids = [f"d{i}" for i in range(len(docs))]
+    single = BM25Retriever()
+    single.add(docs, ids=ids)
+    queries = ["insulin glucose", "w1 w2 w2", "brain w39", "nothing"]
+
+    with ShardedRetriever.from_docs(docs, ids=ids, n_shards=3) as sharded:
+        for q in queries:
+            rows, scores = single.query_rows(q, k=7)
+            s_rows, s_scores = sharded.query_rows(q, k=7)
+            assert rows.tolist() == s_rows.tolist() and scores.tolist() == s_scores.tolist()
+        b_rows, b_scores = single.query_batch(queries, k=5)
+        s_rows, s_scores = sharded.query_batch(queries, k=5)
+        assert (b_rows == s_rows).all() and (b_scores == s_scores).all()
+        assert retrieve_all(queries, sharded, k=3) == retrieve_all(queries, single, k=3)
+        assert sharded.get_docs(["d59", "d0", "d30"]) == [docs[59], docs[0], docs[30]]
+        sharded.save(tmp_path / "shards")
+
+    with ShardedRetriever.open(tmp_path / "shards") as reopened:
+        assert reopened.n_shards == 3
+        assert reopened.query("insulin glucose", k=5) == single.query("insulin glucose", k=5)